@@ -0,0 +1,325 @@
+"""Benchmarks for magicompose (no input() involved).
+
+Usage:
+    python bench_magicompose.py [--sizes 10,1000,100000]
+    python bench_magicompose.py --json > results.jsonl         # one JSON line per benchmark and size
+    python bench_magicompose.py --compare results.jsonl        # exit 1 on timings slower than --tolerance
+"""
+import argparse
+import contextlib
+import io
+import ipaddress
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from magicompose import App, _copy_details
+
+
+def build_app(n_services, path):
+    # synthetic project: ports, named/bind volumes, env, depends_on and networks
+    app = App(path=path)
+    app.p_info = lambda text: None
+    net = app.Network("backend")
+    net.app = app
+    net.subnet = "10.0.0.0/8"
+    app.add_network(net)
+    for i in range(n_services):
+        svc = app.Service(app.file, f"svc{i}")
+        svc.app = app
+        d = svc.service_details
+        d["image"] = "nginx:latest"
+        # unique host ports while they last, container-only beyond 65535
+        d["ports"].append(f"{10000 + i}:80" if 10000 + i <= 65535 else "80")
+        d["volumes"].append({"type": "named", "source": f"data{i % 50}", "target": "/data"})
+        d["volumes"].append({"type": "bind", "source": "./conf", "target": "/etc/conf"})
+        d["environment"]["INDEX"] = str(i)
+        d["environment"]["MODE"] = "production"
+        if i:
+            d["depends_on"].append(f"svc{i - 1}")
+        d["networks"]["backend"] = str(ipaddress.IPv4Address(0x0A000002 + i))  # 10.0.0.2 onwards
+        d["restart"] = "always"
+        app.add_service(svc)
+    return app
+
+
+def bench_export(n_services):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "docker-compose.yml")
+        app = build_app(n_services, path)
+        # timed runs without tracemalloc (it slows allocation-heavy code a lot)
+        t0 = time.perf_counter()
+        app.export_compose()
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        app.export_compose()  # nothing changed: no render, no write
+        unchanged = time.perf_counter() - t0
+        svc = app.get_service("svc0")
+        svc.service_details["environment"]["MODE"] = "debug"
+        svc.invalidate()
+        t0 = time.perf_counter()
+        app.export_compose()  # one dirty service
+        one_dirty = time.perf_counter() - t0
+        size = app.file.stat().st_size
+        imported = App(path=str(Path(tmp) / "imported.yml"))
+        import_seconds = imported.import_compose(path)["seconds"]
+        # fresh project only to measure the peak memory of a cold export
+        app = build_app(n_services, str(Path(tmp) / "peak.yml"))
+        tracemalloc.start()
+        app.export_compose()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"services": n_services, "seconds": cold, "unchanged_seconds": unchanged,
+            "one_dirty_seconds": one_dirty, "import_seconds": import_seconds,
+            "peak_bytes": peak, "file_bytes": size}
+
+
+def bench_memory(n_services):
+    # resident model size: traced bytes per service after build and after a cold export
+    with tempfile.TemporaryDirectory() as tmp:
+        tracemalloc.start()
+        app = build_app(n_services, str(Path(tmp) / "docker-compose.yml"))
+        built, _ = tracemalloc.get_traced_memory()
+        app.export_compose()
+        exported, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        svc = app.get_service("svc0")
+        obj = sys.getsizeof(svc)
+        if hasattr(svc, "__dict__"):  # classes without __slots__
+            obj += sys.getsizeof(svc.__dict__)
+    return {"services": n_services, "build_bytes_per_service": built / n_services,
+            "export_bytes_per_service": exported / n_services,
+            "service_object_bytes": obj}
+
+
+def best_of(repeat, fn):
+    # best wall time of `repeat` runs: the least noisy estimate on a shared machine
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_model(n_services, repeat=5):
+    # the per-service paths on their own, each over the whole project
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(n_services, str(Path(tmp) / "docker-compose.yml"))
+        services = list(app.services)
+
+        def render_cold():
+            for svc in services:
+                svc.invalidate()
+                svc.export_to_docker_format()
+
+        def render_cached():
+            for svc in services:
+                svc.export_to_docker_format()
+
+        def infos():
+            for svc in services:
+                svc.print_infos()
+
+        names = [svc.name for svc in services]
+        random.Random(0).shuffle(names)
+
+        def lookups():
+            for name in names:
+                app.get_service(name)
+
+        def volumes():
+            named = set()
+            for svc in services:
+                named.update(svc.named_volumes())
+
+        def export_cold():
+            for svc in services:
+                svc.invalidate()
+            app._last_export = None
+            app.file.unlink(missing_ok=True)
+            app.export_compose()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = {"services": n_services,
+                      "render_cold_seconds": best_of(repeat, render_cold),
+                      "render_cached_seconds": best_of(repeat, render_cached),
+                      "print_infos_seconds": best_of(repeat, infos),
+                      "get_service_seconds": best_of(repeat, lookups),
+                      "volume_pass_seconds": best_of(repeat, volumes),
+                      "export_compose_seconds": best_of(repeat, export_cold),
+                      "export_unchanged_seconds": best_of(repeat, app.export_compose)}
+    return result
+
+
+def bench_replicate(n_services):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(1, str(Path(tmp) / "docker-compose.yml"))
+        if n_services > 55000:
+            # not enough host ports for one per replica: publish container-only
+            template = app.get_service("svc0")
+            before = _copy_details(template.service_details)
+            template.service_details["ports"] = ["80"]
+            app.update_service(template, before)
+        t0 = time.perf_counter()
+        app.replicate("svc0", n_services, "worker-{i}", env={"INDEX": "{i}"})
+        generate = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        app.export_compose()
+        export = time.perf_counter() - t0
+    return {"services": n_services, "generate_seconds": generate, "export_seconds": export}
+
+
+def bench_dedup(n_services):
+    # replicas share env/volumes/image: plain vs x- anchor export, and what it costs a YAML parser
+    try:
+        import yaml
+    except ImportError:
+        yaml = None
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(1, str(Path(tmp) / "plain.yml"))
+        template = app.get_service("svc0")
+        before = _copy_details(template.service_details)
+        template.service_details["ports"] = ["80"]
+        template.service_details["environment"]["LOG_LEVEL"] = "info"
+        app.update_service(template, before)
+        app.replicate("svc0", n_services - 1, "worker-{i}")
+        result = {"services": n_services}
+        for mode in ("plain", "dedup"):
+            app.file = Path(tmp) / f"{mode}.yml"
+            t0 = time.perf_counter()
+            app.export_compose(dedup=mode == "dedup")
+            result[f"{mode}_export_seconds"] = time.perf_counter() - t0
+            result[f"{mode}_bytes"] = app.file.stat().st_size
+            if yaml is not None:
+                loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+                text = app.file.read_text()
+                t0 = time.perf_counter()
+                yaml.load(text, Loader=loader)
+                result[f"{mode}_parse_seconds"] = time.perf_counter() - t0
+    return result
+
+
+def bench_startup(runs=20):
+    # import-to-first-prompt as reported by the cli, plus the wall time of the whole process
+    script = str(Path(__file__).with_name("magicompose.py"))
+    reported, wall = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            out = subprocess.run([sys.executable, script, "--time-startup", "--no-state"], cwd=tmp,
+                                 capture_output=True, text=True, check=True).stdout
+            wall.append(time.perf_counter() - t0)
+            line = next(line for line in out.splitlines() if line.startswith("startup:"))
+            reported.append(float(line.split()[1]) / 1000)
+    return {"runs": runs, "startup_seconds": statistics.median(reported), "process_seconds": statistics.median(wall)}
+
+
+TABLES = {
+    # bench -> (column title, key, scale, format) rows of the text report
+    "startup": [("runs", "runs", 1, "d"), ("to prompt ms", "startup_seconds", 1000, ".1f"),
+                ("process ms", "process_seconds", 1000, ".1f")],
+    "model": [("services", "services", 1, "d"), ("render ms", "render_cold_seconds", 1000, ".1f"),
+              ("cached ms", "render_cached_seconds", 1000, ".1f"), ("infos ms", "print_infos_seconds", 1000, ".1f"),
+              ("lookup ms", "get_service_seconds", 1000, ".2f"), ("volumes ms", "volume_pass_seconds", 1000, ".1f"),
+              ("export ms", "export_compose_seconds", 1000, ".1f"), ("same ms", "export_unchanged_seconds", 1000, ".2f")],
+    "export": [("services", "services", 1, "d"), ("export s", "seconds", 1, ".3f"), ("same s", "unchanged_seconds", 1, ".3f"),
+               ("1 dirty s", "one_dirty_seconds", 1, ".3f"), ("import s", "import_seconds", 1, ".3f"),
+               ("peak MiB", "peak_bytes", 2 ** -20, ".2f"), ("file MiB", "file_bytes", 2 ** -20, ".2f")],
+    "memory": [("services", "services", 1, "d"), ("B/svc", "build_bytes_per_service", 1, ".0f"),
+               ("B/svc exp", "export_bytes_per_service", 1, ".0f"), ("object B", "service_object_bytes", 1, "d")],
+    "dedup": [("services", "services", 1, "d"), ("plain MiB", "plain_bytes", 2 ** -20, ".2f"),
+              ("dedup MiB", "dedup_bytes", 2 ** -20, ".2f"), ("plain exp s", "plain_export_seconds", 1, ".3f"),
+              ("dedup exp s", "dedup_export_seconds", 1, ".3f"), ("plain yaml s", "plain_parse_seconds", 1, ".3f"),
+              ("dedup yaml s", "dedup_parse_seconds", 1, ".3f")],
+    "replicate": [("replicas", "services", 1, "d"), ("generate s", "generate_seconds", 1, ".3f"),
+                  ("export s", "export_seconds", 1, ".3f")],
+}
+
+
+def print_table(bench, results):
+    columns = TABLES[bench]
+    print(bench)
+    print(" ".join(f"{title:>12}" for title, _, _, _ in columns))
+    for r in results:
+        # missing values (e.g. yaml parse times without pyyaml) show as nan
+        print(" ".join(f"{r.get(key, float('nan')) * scale:>12{fmt}}" for _, key, scale, fmt in columns))
+    print()
+
+
+def compare(results, baseline_path, tolerance, floor=0.001):
+    """Timings more than `tolerance` times slower than the baseline file; returns the report lines.
+
+    Timings under `floor` seconds on both sides are too noisy to compare and skipped.
+    """
+    baseline = {}
+    with open(baseline_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                baseline[(r["bench"], r.get("services"))] = r
+    slower = []
+    for r in results:
+        old = baseline.get((r["bench"], r.get("services")))
+        if old is None:
+            continue
+        for key, value in r.items():
+            if key.endswith("_seconds") and old.get(key) and max(value, old[key]) >= floor:
+                ratio = value / old[key]
+                if ratio > tolerance:
+                    slower.append(f"{r['bench']} {r.get('services', '')} {key}: "
+                                  f"{old[key] * 1000:.2f} -> {value * 1000:.2f} ms (x{ratio:.2f})")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="magicompose benchmarks")
+    parser.add_argument("--sizes", default="10,1000,100000", help="comma separated service counts")
+    parser.add_argument("--only", help=f"comma separated benchmarks among {','.join(TABLES)}")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per model timing (best is kept)")
+    parser.add_argument("--startup-runs", type=int, default=20, help="cli launches for the startup timing")
+    parser.add_argument("--json", action="store_true", help="print one JSON line per benchmark and size instead of tables")
+    parser.add_argument("--compare", help="JSON lines from an earlier --json run; exit 1 on slower timings")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="slowdown ratio --compare accepts")
+    parser.add_argument("--floor-ms", type=float, default=1.0, help="--compare ignores timings below this")
+    args = parser.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",")]
+    benches = args.only.split(",") if args.only else list(TABLES)
+    runners = {
+        "startup": lambda: [bench_startup(args.startup_runs)],
+        "model": lambda: [bench_model(n, args.repeat) for n in sizes],
+        "export": lambda: [bench_export(n) for n in sizes],
+        "memory": lambda: [bench_memory(n) for n in sizes],
+        "dedup": lambda: [bench_dedup(n) for n in sizes],
+        "replicate": lambda: [bench_replicate(n) for n in sizes],
+    }
+    meta = {"version": App(path="docker-compose.yml").version, "python": platform.python_version(), "machine": platform.machine()}
+    results = []
+    for bench in benches:
+        rows = runners[bench]()
+        for r in rows:
+            results.append({"bench": bench, **r, **meta})
+        if args.json:
+            for r in results[-len(rows):]:
+                print(json.dumps(r))
+        else:
+            print_table(bench, rows)
+
+    if args.compare:
+        slower = compare(results, args.compare, args.tolerance, args.floor_ms / 1000)
+        for line in slower:
+            print(f"SLOWER {line}", file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,341 +1,1721 @@
+import time
+
+_STARTED = time.perf_counter()  # for --time-startup
+
 from pathlib import Path
-from colorama import init as colorama_init, Fore, Style
+import argparse
+import contextlib
+import bisect
+import io
+import ipaddress
+import json
 import os
+import re
+import sys
+
+# colorama, hashlib, tempfile and concurrent.futures are imported where they are first needed:
+# most runs are short scripted ones and never reach those paths
+
+_PALETTE = None
+
+
+def _palette():
+    # colors only on a terminal; pipes and scripts get plain text and never load colorama
+    global _PALETTE
+    if _PALETTE is None:
+        _PALETTE = dict.fromkeys(("prompt", "info", "warn", "err", "accent", "plain", "reset"), "")
+        if sys.stdout.isatty():
+            try:
+                from colorama import init as colorama_init, Fore, Style
+            except ImportError:
+                return _PALETTE
+            # initialize colorama (autoreset to avoid manual resets)
+            colorama_init(autoreset=True)
+            _PALETTE = {"prompt": Fore.CYAN, "info": Fore.GREEN, "warn": Fore.YELLOW, "err": Fore.RED,
+                        "accent": Fore.MAGENTA, "plain": Fore.WHITE, "reset": Style.RESET_ALL}
+    return _PALETTE
+
+
+class Registry:
+    """Ordered name -> item store with O(1) lookups and reverse reference indexes.
+
+    ``refs(item)`` returns a mapping kind -> iterable of referenced names, e.g.
+    {"depends_on": [...], "networks": [...]}; for every kind the registry keeps
+    which items point at a given name, so reference checks never scan.
+    """
+
+    def __init__(self, refs=None):
+        self._refs = refs
+        self._seq = 0
+        self._order = {}  # seq -> item (insertion order, survives renames)
+        self._index = {}  # name -> seq
+        self._fwd = {}    # name -> ((kind, tuple of referenced names), ...)
+        self._rev = {}    # kind -> referenced name -> {referrer name: None} (ordered set)
+        self._pending = {}  # names whose references are indexed on first reverse query
+        self._sorted = None  # sorted names for prefix completion, built on first query
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._order.values())
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def get(self, name, default=None):
+        seq = self._index.get(name)
+        return default if seq is None else self._order[seq]
+
+    def names(self):
+        return [item.name for item in self._order.values()]
+
+    def add(self, item, defer_refs=False):
+        # defer_refs leaves the item's references unread until a reverse query
+        # needs them (lazy items stay unmaterialized)
+        if item.name in self._index:
+            raise ValueError(f"'{item.name}' already exists")
+        self._seq += 1
+        self._order[self._seq] = item
+        self._index[item.name] = self._seq
+        if self._sorted is not None:
+            bisect.insort(self._sorted, item.name)
+        if defer_refs and self._refs is not None:
+            self._pending[item.name] = None
+        else:
+            self._link(item.name, item)
+        return item
+
+    def remove(self, name):
+        seq = self._index.pop(name)
+        self._unlink(name)
+        self._unsort(name)
+        return self._order.pop(seq)
+
+    def rename(self, old, new):
+        if new in self._index:
+            raise ValueError(f"'{new}' already exists")
+        item = self.get(old)
+        if item is None:
+            raise KeyError(old)
+        self._unlink(old)
+        self._index[new] = self._index.pop(old)
+        item.name = new
+        self._link(new, item)
+        if self._sorted is not None:
+            self._unsort(old)
+            bisect.insort(self._sorted, new)
+        return item
+
+    def reindex(self, name):
+        # refresh the reverse indexes after the item's references changed
+        self._unlink(name)
+        self._link(name, self.get(name))
+
+    def complete(self, prefix, limit=None):
+        """Sorted names starting with `prefix` (at most `limit` of them)."""
+        if self._sorted is None:
+            # built on the first completion only: bulk adds and imports never pay for it
+            self._sorted = sorted(self._index)
+        names = self._sorted
+        i = bisect.bisect_left(names, prefix)
+        end = len(names) if limit is None else min(len(names), i + limit)
+        found = []
+        while i < end and names[i].startswith(prefix):
+            found.append(names[i])
+            i += 1
+        return found
+
+    def _unsort(self, name):
+        if self._sorted is not None:
+            del self._sorted[bisect.bisect_left(self._sorted, name)]
+
+    def referrers(self, kind, name):
+        """Names of the items whose `kind` references point at `name`."""
+        if self._pending:
+            pending, self._pending = self._pending, {}
+            for pending_name in pending:
+                self._link(pending_name, self.get(pending_name))
+        return list(self._rev.get(kind, {}).get(name, ()))
+
+    def _link(self, name, item):
+        if self._refs is None:
+            return
+        # pairs of tuples rather than a dict: this is kept for every item
+        fwd = tuple((kind, tuple(targets)) for kind, targets in self._refs(item).items() if targets)
+        if fwd:
+            self._fwd[name] = fwd
+        for kind, targets in fwd:
+            rev = self._rev.setdefault(kind, {})
+            for target in targets:
+                rev.setdefault(target, {})[name] = None
+
+    def _unlink(self, name):
+        if name in self._pending:
+            del self._pending[name]
+            return
+        fwd = self._fwd.pop(name, None)
+        if not fwd:
+            return
+        for kind, targets in fwd:
+            rev = self._rev[kind]
+            for target in targets:
+                referrers = rev.get(target)
+                if referrers is not None:
+                    referrers.pop(name, None)
+                    if not referrers:
+                        del rev[target]
+
+
+class CachedRender:
+    """Mixin caching the output of write_docker_format along with its content hash.
+
+    Assigning one of ``_render_fields`` drops the cache automatically; in-place
+    mutations (e.g. service_details["ports"].append) must call invalidate().
+    """
+
+    __slots__ = ("_fragment", "_digest")
+    _render_fields = ()
+    renders = 0  # cache misses, per class (read by the export stats)
+
+    def __setattr__(self, key, value):
+        if key in self._render_fields:
+            self.invalidate()
+        object.__setattr__(self, key, value)
+
+    def invalidate(self):
+        self._fragment = None
+        self._digest = None
+
+    def render(self):
+        if self._fragment is None:
+            type(self).renders += 1
+            buf = io.StringIO()
+            self.write_docker_format(buf)
+            self._fragment = buf.getvalue()
+        return self._fragment
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            import hashlib
+            self._digest = hashlib.blake2b(self.render().encode("utf-8"), digest_size=16).digest()
+        return self._digest
+
+    def export_to_docker_format(self):
+        return self.render()
+
+
+class ProjectState:
+    """Snapshot + append-only journal persisting a project between sessions.
+
+    ``snapshot.json`` holds the whole model as of journal sequence ``seq``;
+    ``journal.jsonl`` gets one line per later operation. Loading replays the
+    entries newer than the snapshot; compact() folds them into a new snapshot.
+    """
+
+    FORMAT = 1
+    COMPACT_EVERY = 500  # journal entries before an automatic compaction
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.snapshot_path = self.directory / "snapshot.json"
+        self.journal_path = self.directory / "journal.jsonl"
+        self.seq = 0
+        self.pending = 0  # journal entries not folded into the snapshot yet
+        self._journal = None
+
+    def exists(self):
+        return self.snapshot_path.exists() or self.journal_path.exists()
+
+    def load(self):
+        """Return (snapshot dict or None, journal entries newer than it)."""
+        snapshot = None
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                try:
+                    snapshot = json.load(f)
+                except ValueError as e:
+                    raise ValueError(f"{self.snapshot_path}: {e}") from None
+            fmt = snapshot.get("format") if isinstance(snapshot, dict) else None
+            if fmt != self.FORMAT:
+                raise ValueError(f"{self.snapshot_path}: unsupported state format {fmt!r}")
+            self.seq = snapshot.get("seq", 0)
+        entries = []
+        if self.journal_path.exists():
+            good = 0  # bytes of complete entries
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line) if line.endswith(b"\n") else None
+                    except ValueError:
+                        entry = None
+                    if entry is None:
+                        break  # torn last line from an interrupted write
+                    good += len(line)
+                    if entry["seq"] > self.seq:
+                        entries.append(entry)
+            # drop the torn tail, or the next append would continue that line
+            if good < self.journal_path.stat().st_size:
+                os.truncate(self.journal_path, good)
+        if entries:
+            self.seq = entries[-1]["seq"]
+        self.pending = len(entries)
+        return snapshot, entries
+
+    def append(self, op, **payload):
+        if self._journal is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self.seq += 1
+        self.pending += 1
+        self._journal.write(json.dumps({"seq": self.seq, "op": op, **payload}, separators=(",", ":")) + "\n")
+        self._journal.flush()
+
+    def compact(self, snapshot):
+        # write the snapshot atomically first; entries it covers are skipped on load
+        # even if the truncation below never happens
+        self.directory.mkdir(parents=True, exist_ok=True)
+        snapshot = {"format": self.FORMAT, "seq": self.seq, **snapshot}
+        tmp = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self.close()
+        open(self.journal_path, "w").close()
+        self.pending = 0
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+class CommandStats:
+    """Wall time per command and export step, aggregated by name.
+
+    Each measure() also records the time spent waiting in prompts, any counters
+    the caller fills in (bytes written, services rendered) and, with
+    ``trace_memory``, the tracemalloc peak. With ``path`` every record is
+    appended there as one JSON line as soon as it completes.
+    """
+
+    def __init__(self, path=None, trace_memory=False):
+        self.path = Path(path) if path else None
+        self.trace_memory = trace_memory
+        self.totals = {}  # name -> {"count", "seconds", "max_seconds", "input_seconds", counters...}
+        self.input_seconds = 0.0  # time spent in prompts, read around each measure()
+        self._peaks = []  # peak seen by each open measure() before a nested one reset it
+        self._out = None
+        if trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextlib.contextmanager
+    def measure(self, name, **counters):
+        """Time the block; the yielded dict takes extra counters for the record."""
+        record = dict(counters)
+        if self.trace_memory:
+            import tracemalloc
+            if self._peaks:
+                # reset_peak below would lose the enclosing measure's peak so far
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        waited = self.input_seconds
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - t0
+            if self.trace_memory:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                record["peak_bytes"] = peak
+            self.record(name, seconds, input_seconds=self.input_seconds - waited, **record)
+
+    def record(self, name, seconds, **fields):
+        total = self.totals.get(name)
+        if total is None:
+            total = self.totals[name] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+        total["count"] += 1
+        total["seconds"] += seconds
+        total["max_seconds"] = max(total["max_seconds"], seconds)
+        for key, value in fields.items():
+            if key == "peak_bytes":
+                total[key] = max(total.get(key, 0), value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                total[key] = total.get(key, 0) + value
+        if self.path is not None:
+            if self._out is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._out = open(self.path, "a", encoding="utf-8")
+            self._out.write(json.dumps({"time": time.time(), "name": name, "seconds": seconds, **fields},
+                                       separators=(",", ":")) + "\n")
+            self._out.flush()
+
+    def reset(self):
+        self.totals = {}
+
+    def close(self):
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+
+class IPv4Allocator:
+    """Address bookkeeping for one network: a bitmap with one bit per address of the subnet.
+
+    The network/broadcast addresses and the gateway (docker's default is the
+    first host) are reserved up front; allocate() hands out the next free
+    address of ``ip_range`` (whole subnet by default) starting from a cursor.
+    """
+
+    _FREE_BYTE = re.compile(rb"[^\xff]")
+
+    def __init__(self, subnet, gateway="", ip_range=""):
+        try:
+            self.network = ipaddress.IPv4Network(subnet)
+        except ValueError as e:
+            raise ValueError(f"invalid subnet '{subnet}': {e}") from None
+        self.base = int(self.network.network_address)
+        self.size = self.network.num_addresses
+        self.bits = bytearray((self.size + 7) // 8)
+        self.owners = {}  # offset -> service name, for conflict messages
+        if self.size > 2:
+            self._set(0)
+            self._set(self.size - 1)
+        self.gateway = gateway or (str(self.network.network_address + 1) if self.size > 2 else "")
+        if self.gateway:
+            self._set(self._offset(self.gateway, "gateway"))
+        self.lo, self.hi = 0, self.size
+        self.ip_range = ip_range
+        if ip_range:
+            try:
+                rng = ipaddress.IPv4Network(ip_range)
+            except ValueError as e:
+                raise ValueError(f"invalid ip_range '{ip_range}': {e}") from None
+            if not rng.subnet_of(self.network):
+                raise ValueError(f"ip_range {ip_range} is not inside subnet {self.network}")
+            self.lo = int(rng.network_address) - self.base
+            self.hi = self.lo + rng.num_addresses
+        self._cursor = self.lo
+
+    def check(self, ip, owner):
+        """Raise ValueError unless `owner` may use `ip` on this network."""
+        offset = self._offset(ip, "address")
+        if self.bits[offset >> 3] >> (offset & 7) & 1 and self.owners.get(offset) != owner:
+            holder = self.owners.get(offset)
+            raise ValueError(f"{ip} is already used by '{holder}'" if holder else f"{ip} is reserved on {self.network}")
+        return offset
+
+    def reserve(self, ip, owner):
+        offset = self.check(ip, owner)
+        self._set(offset)
+        self.owners[offset] = owner
+
+    def release(self, ip):
+        offset = int(ipaddress.IPv4Address(ip)) - self.base
+        if self.owners.pop(offset, None) is not None:
+            self.bits[offset >> 3] &= ~(1 << (offset & 7))
+            if self.lo <= offset < self._cursor:
+                self._cursor = offset
+
+    def rename_owner(self, ip, owner):
+        self.owners[int(ipaddress.IPv4Address(ip)) - self.base] = owner
+
+    def allocate(self, owner):
+        """Reserve and return the next free address (amortized O(1): full bytes are skipped in C)."""
+        for start, end in ((self._cursor, self.hi), (self.lo, self._cursor)):
+            offset = start
+            while offset < end:
+                if offset & 7 == 0:
+                    match = self._FREE_BYTE.search(self.bits, offset >> 3, (end + 7) >> 3)
+                    if match is None:
+                        break
+                    offset = max(offset, match.start() << 3)
+                if offset < end and not self.bits[offset >> 3] >> (offset & 7) & 1:
+                    self._set(offset)
+                    self.owners[offset] = owner
+                    self._cursor = offset + 1
+                    return str(ipaddress.IPv4Address(self.base + offset))
+                offset += 1
+        raise ValueError(f"no free address left in {self.ip_range or self.network}")
+
+    def _offset(self, ip, what):
+        try:
+            address = ipaddress.IPv4Address(ip)
+        except ValueError:
+            raise ValueError(f"invalid IPv4 {what} '{ip}'") from None
+        if address not in self.network:
+            raise ValueError(f"{what} {ip} is outside subnet {self.network}")
+        return int(address) - self.base
+
+    def _set(self, offset):
+        self.bits[offset >> 3] |= 1 << (offset & 7)
+
+
+def parse_port_binding(spec):
+    """Host side of a compose port mapping as (host ip, first, last, protocol).
+
+    Handles "80", "8080:80", "127.0.0.1:8080:80", "[::1]:8080:80", "8080:80/udp"
+    and ranges like "8000-8100:8000-8100". Returns None when no host port is
+    published (container-only or ephemeral "ip::80"). Raises ValueError.
+    """
+    text, _, proto = str(spec).strip().partition("/")
+    proto = proto or "tcp"
+    if proto not in ("tcp", "udp", "sctp"):
+        raise ValueError(f"invalid protocol in port mapping '{spec}'")
+    ip = ""
+    if text.startswith("["):
+        end = text.find("]:")
+        if end < 0:
+            raise ValueError(f"invalid port mapping '{spec}'")
+        ip, text = text[1:end], text[end + 2:]
+    parts = text.rsplit(":", 2)
+    if len(parts) == 3:
+        if ip:
+            raise ValueError(f"invalid port mapping '{spec}'")
+        ip = parts.pop(0)
+    container = _port_range(parts[-1], spec)
+    if len(parts) == 1 or not parts[0]:
+        return None
+    first, last = _port_range(parts[0], spec)
+    if container[1] - container[0] not in (0, last - first):
+        raise ValueError(f"host and container ranges differ in size in '{spec}'")
+    if ip in ("0.0.0.0", "::"):
+        ip = ""  # all interfaces
+    return ip, first, last, proto
+
+
+def _port_range(text, spec):
+    first, sep, last = text.partition("-")
+    if not first.isdigit() or (sep and not last.isdigit()):
+        raise ValueError(f"invalid port mapping '{spec}'")
+    first, last = int(first), int(last or first)
+    if not 0 < first <= last <= 65535:
+        raise ValueError(f"invalid port range in '{spec}'")
+    return first, last
+
+
+class PortIndex:
+    """Project-wide host port bindings.
+
+    Every (host ip, protocol) keeps sorted, disjoint [first, last] intervals,
+    so a conflict check is a bisect instead of an all-pairs scan. A binding on
+    all interfaces (ip "") conflicts with every ip of the same protocol.
+    """
+
+    def __init__(self):
+        self._keys = {}  # (ip, proto) -> (starts, ends, owners), sorted by start
+        self.problems = []
+
+    def conflict(self, binding, owner=None):
+        """(owner, first, last) of a binding overlapping `binding` held by someone else, or None."""
+        ip, first, last, proto = binding
+        for key in self._related(ip, proto):
+            starts, ends, owners = self._keys[key]
+            i = bisect.bisect_right(starts, last) - 1
+            # intervals are disjoint: the overlapping ones are contiguous just before `last`
+            while i >= 0 and ends[i] >= first:
+                if owners[i] != owner:
+                    return owners[i], starts[i], ends[i]
+                i -= 1
+        return None
+
+    def add(self, binding, owner):
+        # no owner exemption here: overlapping intervals would break the bisect invariant
+        held = self.conflict(binding)
+        if held:
+            raise ValueError(_port_conflict(binding, held))
+        ip, first, last, proto = binding
+        starts, ends, owners = self._keys.setdefault((ip, proto), ([], [], []))
+        i = bisect.bisect_left(starts, first)
+        starts.insert(i, first)
+        ends.insert(i, last)
+        owners.insert(i, owner)
+
+    def remove(self, binding, owner):
+        ip, first, last, proto = binding
+        starts, ends, owners = self._keys.get((ip, proto), ((), (), ()))
+        i = bisect.bisect_left(starts, first)
+        while i < len(starts) and starts[i] == first:
+            if ends[i] == last and owners[i] == owner:
+                del starts[i], ends[i], owners[i]
+                return
+            i += 1
+
+    def next_free(self, start=8000, count=1, ip="", proto="tcp"):
+        """First host port p >= start with p..p+count-1 free for (ip, proto)."""
+        port = start
+        while port + count - 1 <= 65535:
+            held = self.conflict((ip, port, port + count - 1, proto))
+            if held is None:
+                return port
+            port = held[2] + 1  # jump past the blocking interval
+        raise ValueError(f"no free host port range of {count} from {start}")
+
+    def _related(self, ip, proto):
+        if ip:
+            return [key for key in ((ip, proto), ("", proto)) if key in self._keys]
+        return [key for key in self._keys if key[1] == proto]
+
+
+def _port_conflict(binding, held):
+    ip, first, last, proto = binding
+    owner, held_first, held_last = held
+    ports = f"{first}-{last}" if last != first else str(first)
+    held_ports = f"{held_first}-{held_last}" if held_last != held_first else str(held_first)
+    return f"host port {ip + ':' if ip else ''}{ports}/{proto} is taken by '{owner}' ({held_ports})"
+
+
+class DependencyGraph:
+    """depends_on graph of a services registry; every query is linear in services + edges."""
+
+    def __init__(self, services):
+        # name -> unique depends_on targets (in declaration order)
+        self.deps = {svc.name: list(dict.fromkeys(svc.service_details.get("depends_on", []))) for svc in services}
+        self.rev = {}  # name -> services depending on it
+        for name, deps in self.deps.items():
+            for dep in deps:
+                self.rev.setdefault(dep, []).append(name)
+
+    def missing(self):
+        """(service, target) pairs whose target is not a service."""
+        return [(name, dep) for name, deps in self.deps.items() for dep in deps if dep not in self.deps]
+
+    def find_cycle(self):
+        """Return one cycle as a path [a, b, ..., a], or None (iterative DFS)."""
+        state = {}  # name -> 1 on the current path, 2 finished
+        for root in self.deps:
+            if root in state:
+                continue
+            state[root] = 1
+            path = [root]
+            stack = [iter(self.deps[root])]
+            while stack:
+                for dep in stack[-1]:
+                    if dep not in self.deps:
+                        continue  # reported by missing()
+                    seen = state.get(dep)
+                    if seen == 1:
+                        return path[path.index(dep):] + [dep]
+                    if seen is None:
+                        state[dep] = 1
+                        path.append(dep)
+                        stack.append(iter(self.deps[dep]))
+                        break
+                else:
+                    state[path.pop()] = 2
+                    stack.pop()
+        return None
+
+    def waves(self):
+        """Start waves: each wave only depends on earlier ones, so it can start in parallel."""
+        remaining = {name: sum(1 for dep in deps if dep in self.deps) for name, deps in self.deps.items()}
+        wave = [name for name, count in remaining.items() if count == 0]
+        waves = []
+        placed = 0
+        while wave:
+            waves.append(wave)
+            placed += len(wave)
+            following = []
+            for name in wave:
+                for dependent in self.rev.get(name, ()):
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        following.append(dependent)
+            wave = following
+        if placed != len(self.deps):
+            raise ValueError("dependency cycle: " + " -> ".join(self.find_cycle()))
+        return waves
+
+    def dependents(self, name):
+        """All services that (transitively) depend on `name`, nearest first."""
+        return self._walk(name, self.rev)
+
+    def dependencies(self, name):
+        """All services `name` (transitively) depends on, nearest first."""
+        return self._walk(name, self.deps)
+
+    def _walk(self, name, edges):
+        seen = {name: None}
+        queue = [name]
+        for current in queue:
+            for nxt in edges.get(current, ()):
+                if nxt not in seen:
+                    seen[nxt] = None
+                    queue.append(nxt)
+        return queue[1:]
+
+
+def _copy_details(details):
+    # service_details only holds strings, flat lists/dicts and volume dicts
+    copied = {}
+    for key, value in details.items():
+        if isinstance(value, list):
+            value = [dict(v) if isinstance(v, dict) else v for v in value]
+        elif isinstance(value, dict):
+            value = dict(value)
+        copied[key] = value
+    return copied
+
+
+def service_refs(svc):
+    return {
+        "depends_on": svc.service_details.get("depends_on", ()),
+        "networks": svc.service_details.get("networks", {}).keys(),
+    }
+
+
+def _fill_slots(obj, **values):
+    # bypasses __setattr__ (no cache invalidation) for the fast constructors
+    for key, value in values.items():
+        object.__setattr__(obj, key, value)
+
+
+# performance tuning fields: compose syntax accepted for each, checked before it is stored
+RESOURCE_KEYS = ("limits.cpus", "limits.memory", "reservations.cpus", "reservations.memory")
+ULIMIT_NAMES = ("core", "cpu", "data", "fsize", "locks", "memlock", "msgqueue", "nice", "nofile",
+                "nproc", "rss", "rtprio", "rttime", "sigpending", "stack")
+HEALTHCHECK_KEYS = ("test", "interval", "timeout", "retries", "start_period")
+DEPENDS_CONDITIONS = ("service_started", "service_healthy", "service_completed_successfully")
+
+_SIZE_RE = re.compile(r"\d+(\.\d+)?([bkmg]b?)?", re.IGNORECASE)      # 512m, 1gb, 1.5g, 1048576
+_DURATION_RE = re.compile(r"(\d+(\.\d+)?(ns|us|ms|s|m|h))+")          # 30s, 1m30s
+_CPUSET_RE = re.compile(r"\d+(-\d+)?(,\d+(-\d+)?)*")                  # 0-3, 0,2
+_SYSCTL_RE = re.compile(r"[a-z0-9_]+(\.[a-z0-9_*-]+)+", re.IGNORECASE)  # net.core.somaxconn
+
+
+def check_tuning(kind, value):
+    """Problem with one tuning value (None when valid); kind names the syntax to check."""
+    value = str(value).strip()
+    if kind == "cpus":
+        try:
+            ok = float(value) > 0
+        except ValueError:
+            ok = False
+        return None if ok else f"invalid cpus '{value}' (a positive number, e.g. 0.5)"
+    if kind in ("memory", "shm_size"):
+        return None if _SIZE_RE.fullmatch(value) else f"invalid {kind} '{value}' (e.g. 512m, 1g)"
+    if kind == "ulimit":
+        name, _, limits = value.partition("=")
+        if name.strip() not in ULIMIT_NAMES:
+            return f"unknown ulimit '{name.strip()}' (one of {', '.join(ULIMIT_NAMES)})"
+        soft, _, hard = limits.strip().partition(":")
+        if not soft.isdigit() or (hard and not hard.isdigit()):
+            return f"invalid ulimit '{value}' (name=value or name=soft:hard)"
+        if hard and int(soft) > int(hard):
+            return f"ulimit '{name.strip()}': soft limit above the hard one"
+        return None
+    if kind == "tmpfs":
+        return None if value.startswith("/") else f"invalid tmpfs '{value}' (absolute path[:options])"
+    if kind == "sysctl":
+        key, sep, val = value.partition("=")
+        if not sep or not val.strip() or not _SYSCTL_RE.fullmatch(key.strip()):
+            return f"invalid sysctl '{value}' (key=value, e.g. net.core.somaxconn=1024)"
+        return None
+    if kind == "cpuset":
+        return None if _CPUSET_RE.fullmatch(value) else f"invalid cpuset '{value}' (e.g. 0-3 or 0,2)"
+    if kind in ("interval", "timeout", "start_period"):
+        return None if _DURATION_RE.fullmatch(value) else f"invalid {kind} '{value}' (a duration, e.g. 30s)"
+    if kind == "retries":
+        return None if value.isdigit() else f"invalid retries '{value}' (a whole number)"
+    if kind == "test":
+        return None if value else "healthcheck test required"
+    if kind == "condition":
+        return None if value in DEPENDS_CONDITIONS else f"invalid condition '{value}' (one of {', '.join(DEPENDS_CONDITIONS)})"
+    raise ValueError(f"unknown tuning kind '{kind}'")
+
+
+def parse_dependency(text):
+    """'db', 'db:healthy' or 'db:service_healthy' -> (name, condition or '')."""
+    name, _, condition = text.partition(":")
+    condition = condition.strip()
+    if condition and not condition.startswith("service_"):
+        condition = "service_completed_successfully" if condition == "completed" else f"service_{condition}"
+    return name.strip(), condition
+
+
+def _yaml_value(value):
+    # a list (healthcheck test in exec form) becomes a flow list, a string a double-quoted
+    # scalar: JSON is valid YAML for both, and escapes quotes and backslashes
+    return json.dumps(value)
+
+
+# optional service_details keys:
+#   depends_on_conditions  depends_on name -> condition (written as long-form depends_on)
+#   resources              RESOURCE_KEYS -> value (written under deploy.resources)
+#   ulimits                name -> "value" or "soft:hard"
+#   shm_size, cpuset       strings
+#   tmpfs                  list of "/path[:options]"
+#   sysctls                key -> value
+#   healthcheck            HEALTHCHECK_KEYS -> value (test: shell string, or list in exec form)
+TUNING_FIELDS = ("depends_on_conditions", "resources", "ulimits", "shm_size", "tmpfs", "sysctls", "cpuset", "healthcheck")
+
+
+# Service class for service configuration/export
+class Service(CachedRender):
+    __slots__ = ("file", "name", "app", "_lazy", "_details", "_named")
+    _render_fields = ("name", "service_details")
+
+    def __init__(self, file, name):
+        self.file = file
+        self.name = name
+        self._lazy = None  # (fragment, named volume names) until first access, for imports
+        self._named = None
+        self.service_details = {
+            "image": "auto",
+            "container_name": "",   # new: allow explicit container_name
+            "ports": [],
+            "expose": [],           # new: container-only exposed ports
+            "volumes": [],
+            "environment": {},  # dict
+            "depends_on": [],
+            "command": "",
+            "networks": {},  # dict: network_name -> ipv4_address (empty string if none)
+            "restart": "no"
+            # TUNING_FIELDS are only present once set: most services never use them
+        }
+        # app reference will be injected by App when created (svc.app = self_app)
+        self.app = None
+
+    @property
+    def service_details(self):
+        if self._lazy is not None:
+            fragment, named = self._lazy
+            self._lazy = None
+            # fields absent from the block are empty, not the interactive defaults
+            defaults = type(self)(self.file, self.name).service_details
+            details = {k: type(v)() for k, v in defaults.items()}
+            details.update(parse_service_fragment(fragment, named))
+            object.__setattr__(self, "_details", details)
+        return self._details
+
+    @classmethod
+    def from_fragment(cls, file, name, fragment, named_volumes):
+        # imported service kept as its raw block; bypasses __init__ so
+        # opening a huge file does not pay for 100k default dicts
+        svc = cls.__new__(cls)
+        _fill_slots(
+            svc, file=file, name=name, app=None, _lazy=(fragment, named_volumes),
+            _details=None, _named=None, _fragment=fragment, _digest=None,
+        )
+        return svc
+
+    @classmethod
+    def from_details(cls, file, name, details):
+        # restore path: details come complete from a snapshot/journal
+        svc = cls.__new__(cls)
+        _fill_slots(
+            svc, file=file, name=name, app=None, _lazy=None,
+            _details=details, _named=None, _fragment=None, _digest=None,
+        )
+        return svc
+
+    @service_details.setter
+    def service_details(self, value):
+        self._lazy = None
+        self._details = value
+
+    def invalidate(self):
+        super().invalidate()
+        self._named = None
+
+    def to_state(self):
+        # snapshot entry tail: [details], or [None, fragment, named volumes] while lazy
+        if self._lazy is not None:
+            return [None, self._lazy[0], list(self.named_volumes())]
+        return [self.service_details]
+
+    def named_volumes(self):
+        if self._named is None and self._lazy is not None:
+            # imported and untouched: read the sources without a full parse
+            fragment, named = self._lazy
+            self._named = tuple(src for src in _volume_sources(fragment) if src in named)
+        if self._named is None:
+            self._named = tuple(
+                vol.get("source") for vol in self.service_details.get("volumes", [])
+                if isinstance(vol, dict) and vol.get("type") == "named"
+            )
+        return self._named
+
+    def configure_interactive(self, available_networks=None):
+        available_networks = available_networks or []
+        app = self.app  # local shortcut; required for colored I/O
+
+        image = app.p_input(f"Image for '{self.name}' (default '{self.service_details['image']}', auto: build a generated Dockerfile): ").strip()
+        if image:
+            self.service_details["image"] = image
+
+        # new: custom container name
+        cname = app.p_input("Container name (leave blank to skip): ").strip()
+        if cname:
+            self.service_details["container_name"] = cname
+
+        # If image appears to be MySQL, offer quick MySQL env setup
+        if "mysql" in self.service_details["image"].lower():
+            app.p_accent("Detected MySQL image. Optionally set MySQL environment variables (leave blank to skip each).")
+            mysql_defaults = {
+                "MYSQL_ROOT_PASSWORD": "rootpassword",
+                "MYSQL_DATABASE": "demo",
+                "MYSQL_USER": "user",
+                "MYSQL_PASSWORD": "password"
+            }
+            for k, suggested in mysql_defaults.items():
+                v = app.p_input(f"{k} (suggested '{suggested}'): ").strip()
+                if v:
+                    self.service_details["environment"][k] = v
+
+        # Ports
+        app.p_info("Enter port mappings (host:container, or auto:container for the next free host port). Leave blank to finish.")
+        while True:
+            p = app.p_input("Port mapping: ").strip()
+            if not p:
+                break
+            problem = app.check_port(self.name, p)
+            if problem:
+                app.p_warn(f"{problem}. Try again.")
+                continue
+            self.service_details["ports"].append(p)
+
+        # Expose (container-only ports)
+        app.p_info("Enter exposed ports (container-only, e.g. 8080). Leave blank to finish.")
+        while True:
+            ex = app.p_input("Expose port: ").strip()
+            if not ex:
+                break
+            self.service_details["expose"].append(ex)
+
+        # Volumes
+        app.p_info("Add volumes. Choose type 'bind' for host bind (HOST_PATH -> CONTAINER_PATH) or 'named' for named volume (VOLUME_NAME -> CONTAINER_PATH). Leave type blank to finish.")
+        while True:
+            vol_type = app.p_input("Volume type (bind/named, leave blank to finish): ").strip().lower()
+            if not vol_type:
+                break
+            if vol_type not in ("bind", "named"):
+                app.p_warn("Invalid type. Use 'bind' or 'named'.")
+                continue
+            src = app.p_input("Host path (for bind) or volume name (for named): ").strip()
+            if not src:
+                app.p_warn("Source/name required. Skipping this entry.")
+                continue
+            tgt = app.p_input("Container path (e.g. /data): ").strip()
+            if not tgt:
+                app.p_warn("Container path required. Skipping this entry.")
+                continue
+            # store structured volume info
+            self.service_details["volumes"].append({
+                "type": vol_type,
+                "source": src,
+                "target": tgt
+            })
+
+        # Environment variables
+        app.p_info("Enter environment variables as KEY=VALUE. Leave blank to finish.")
+        while True:
+            e = app.p_input("Env: ").strip()
+            if not e:
+                break
+            if "=" in e:
+                k, v = e.split("=", 1)
+                self.service_details["environment"][k.strip()] = v.strip()
+            else:
+                app.p_warn("Invalid format. Use KEY=VALUE.")
+
+        # depends_on, optionally gated on the dependency's state (name:healthy)
+        app.p_info("Enter dependent service names, as name or name:condition (started, healthy, completed). Leave blank to finish.")
+        while True:
+            d = app.p_input("Depends on service: ").strip()
+            if not d:
+                break
+            d, condition = parse_dependency(d)
+            problem = check_tuning("condition", condition) if condition else None
+            if problem:
+                app.p_warn(f"{problem}. Try again.")
+                continue
+            if d not in self.service_details["depends_on"]:
+                self.service_details["depends_on"].append(d)
+            if condition:
+                self.service_details.setdefault("depends_on_conditions", {})[d] = condition
+
+        # Command
+        cmd = app.p_input("Command to run (leave blank to skip): ").strip()
+        if cmd:
+            self.service_details["command"] = cmd
+
+        # Networks selection (supports name or name=ipv4_address)
+        if available_networks:
+            app.p_accent("Available networks: " + ", ".join(available_networks))
+        app.p_info("Enter network names to attach this service to. You can specify an IP with 'name=ipv4_address' (or 'name=auto' for the next free one). Leave blank to finish.")
+        while True:
+            n = app.p_input("Network (or name=ip): ").strip()
+            if not n:
+                break
+            if "=" in n:
+                name, ip = n.split("=", 1)
+                name = name.strip()
+                ip = ip.strip()
+                problem = app.check_ipv4(self.name, name, ip) if name and ip else None
+                if problem:
+                    app.p_warn(f"{problem}. Try again.")
+                    continue
+                if name:
+                    self.service_details["networks"][name] = ip
+            else:
+                self.service_details["networks"][n] = ""
+
+        # Restart policy
+        restart = app.p_input("Restart policy (no, always, on-failure, unless-stopped) [no]: ").strip()
+        if restart:
+            self.service_details["restart"] = restart
+
+        tune = app.p_input("Performance tuning (resources, ulimits, shm_size, tmpfs, sysctls, cpuset, healthcheck)? [y/N]: ")
+        if tune.strip().lower() == "y":
+            self.configure_tuning()
+        self.invalidate()
+
+    def configure_tuning(self):
+        # prompts for TUNING_FIELDS; blank keeps the current value
+        app = self.app
+        details = self.service_details
+
+        def ask(label, kind, current):
+            while True:
+                value = app.p_input(f"{label} [{current or 'none'}]: ").strip()
+                problem = check_tuning(kind, value) if value else None
+                if not problem:
+                    return value
+                app.p_warn(f"{problem}. Try again.")
+
+        resources = details.setdefault("resources", {})
+        for key in RESOURCE_KEYS:
+            section, _, kind = key.partition(".")
+            value = ask(f"{'CPU' if kind == 'cpus' else 'Memory'} {section[:-1]} (e.g. {'0.5' if kind == 'cpus' else '512m'})",
+                        kind, resources.get(key))
+            if value:
+                resources[key] = value
+
+        app.p_info("Enter ulimits as name=value or name=soft:hard (e.g. nofile=65535:65535). Leave blank to finish.")
+        while True:
+            u = app.p_input("Ulimit: ").strip()
+            if not u:
+                break
+            problem = check_tuning("ulimit", u)
+            if problem:
+                app.p_warn(f"{problem}. Try again.")
+                continue
+            name, _, limits = u.partition("=")
+            details.setdefault("ulimits", {})[name.strip()] = limits.strip()
+
+        shm = ask("Shared memory size /dev/shm (e.g. 256m)", "shm_size", details.get("shm_size"))
+        if shm:
+            details["shm_size"] = shm
+
+        app.p_info("Enter tmpfs mounts as /path or /path:options (e.g. /tmp:size=64m). Leave blank to finish.")
+        while True:
+            t = app.p_input("tmpfs: ").strip()
+            if not t:
+                break
+            problem = check_tuning("tmpfs", t)
+            if problem:
+                app.p_warn(f"{problem}. Try again.")
+                continue
+            details.setdefault("tmpfs", []).append(t)
+
+        app.p_info("Enter sysctls as key=value (e.g. net.core.somaxconn=1024). Leave blank to finish.")
+        while True:
+            sc = app.p_input("Sysctl: ").strip()
+            if not sc:
+                break
+            problem = check_tuning("sysctl", sc)
+            if problem:
+                app.p_warn(f"{problem}. Try again.")
+                continue
+            k, v = sc.split("=", 1)
+            details.setdefault("sysctls", {})[k.strip()] = v.strip()
+
+        cpuset = ask("CPUs to pin the container to (cpuset, e.g. 0-3)", "cpuset", details.get("cpuset"))
+        if cpuset:
+            details["cpuset"] = cpuset
+
+        health = details.setdefault("healthcheck", {})
+        test = ask("Healthcheck command (shell, e.g. curl -f http://localhost/ || exit 1)", "test", health.get("test"))
+        if test:
+            health["test"] = test
+        if health.get("test"):
+            for key, example in (("interval", "30s"), ("timeout", "5s"), ("retries", "3"), ("start_period", "10s")):
+                value = ask(f"Healthcheck {key} (e.g. {example})", key, health.get(key))
+                if value:
+                    health[key] = value
+        # empty containers are not kept (see TUNING_FIELDS)
+        for field in ("resources", "ulimits", "tmpfs", "sysctls", "healthcheck"):
+            if not details.get(field, True):
+                del details[field]
+        self.invalidate()
+
+    def apply_spec(self, spec):
+        # non-interactive counterpart of configure_interactive (batch mode)
+        unknown = set(spec) - set(self.service_details) - set(TUNING_FIELDS)
+        if unknown:
+            raise ValueError(f"service '{self.name}': unknown field(s) {', '.join(sorted(unknown))}")
+        details = self.service_details
+        for key in ("image", "container_name", "command", "restart"):
+            if spec.get(key) is not None:
+                details[key] = str(spec[key])
+        for key in ("ports", "expose", "depends_on"):
+            if spec.get(key):
+                details[key] = [str(v) for v in spec[key]]
+        self._apply_tuning_spec(spec)
+        for vol in spec.get("volumes") or []:
+            if isinstance(vol, dict):
+                vol_type = vol.get("type", "named")
+                src, tgt = vol.get("source"), vol.get("target")
+            else:
+                src, _, tgt = str(vol).partition(":")
+                # short syntax: paths are binds, plain names are named volumes
+                vol_type = "bind" if src.startswith((".", "/", "~")) else "named"
+            if vol_type not in ("bind", "named") or not src or not tgt:
+                raise ValueError(f"service '{self.name}': invalid volume {vol!r}")
+            details["volumes"].append({"type": vol_type, "source": src, "target": tgt})
+        env = spec.get("environment") or {}
+        if isinstance(env, list):
+            # accept the compose list form too: ["KEY=VALUE", ...]
+            env = dict(e.split("=", 1) if "=" in e else (e, "") for e in env)
+        for k, v in env.items():
+            details["environment"][str(k)] = "" if v is None else str(v)
+        nets = spec.get("networks") or {}
+        if isinstance(nets, list):
+            nets = {n: "" for n in nets}
+        for name, cfg in nets.items():
+            if isinstance(cfg, dict):
+                cfg = cfg.get("ipv4_address", "")
+            details["networks"][name] = cfg or ""
+        self.invalidate()
+
+    def _apply_tuning_spec(self, spec):
+        # spec values for TUNING_FIELDS, in compose syntax; invalid values raise ValueError
+        details = self.service_details
+        tuning = {}
+
+        def check(kind, value):
+            problem = check_tuning(kind, value)
+            if problem:
+                raise ValueError(f"service '{self.name}': {problem}")
+            return str(value).strip()
+
+        conditions = dict(spec.get("depends_on_conditions") or {})
+        if isinstance(spec.get("depends_on"), dict):
+            # compose long form: {name: {condition: ...}}
+            for name, cfg in spec["depends_on"].items():
+                if (cfg or {}).get("condition"):
+                    conditions[name] = cfg["condition"]
+        for name, condition in conditions.items():
+            if name not in details["depends_on"]:
+                raise ValueError(f"service '{self.name}': condition for '{name}', which is not in depends_on")
+            tuning.setdefault("depends_on_conditions", {})[str(name)] = check("condition", condition)
+        for section, limits in (spec.get("resources") or {}).items():
+            # {"limits": {"cpus": ..., "memory": ...}, "reservations": {...}} or "limits.cpus": ...
+            items = limits.items() if isinstance(limits, dict) else [("", limits)]
+            for kind, value in items:
+                key = f"{section}.{kind}" if kind else section
+                if key not in RESOURCE_KEYS:
+                    raise ValueError(f"service '{self.name}': unknown resource '{key}' (one of {', '.join(RESOURCE_KEYS)})")
+                tuning.setdefault("resources", {})[key] = check(key.partition(".")[2], value)
+        for name, value in (spec.get("ulimits") or {}).items():
+            if isinstance(value, dict):
+                value = value.get("soft") if value.get("hard") is None else f"{value.get('soft')}:{value['hard']}"
+            tuning.setdefault("ulimits", {})[str(name)] = check("ulimit", f"{name}={value}").partition("=")[2]
+        tmpfs = spec.get("tmpfs") or []
+        for mount in [tmpfs] if isinstance(tmpfs, str) else tmpfs:
+            tuning.setdefault("tmpfs", []).append(check("tmpfs", mount))
+        sysctls = spec.get("sysctls") or {}
+        if isinstance(sysctls, list):
+            sysctls = dict(str(item).split("=", 1) if "=" in str(item) else (item, "") for item in sysctls)
+        for key, value in sysctls.items():
+            tuning.setdefault("sysctls", {})[str(key)] = check("sysctl", f"{key}={value}").partition("=")[2]
+        for key in ("shm_size", "cpuset"):
+            if spec.get(key) is not None:
+                tuning[key] = check(key, spec[key])
+        health = spec.get("healthcheck") or {}
+        if health:
+            unknown = set(health) - set(HEALTHCHECK_KEYS)
+            if unknown:
+                raise ValueError(f"service '{self.name}': unknown healthcheck field(s) {', '.join(sorted(unknown))}")
+            test = health.get("test")
+            if isinstance(test, list):
+                # exec form stays a list (written back as a flow list)
+                check("test", " ".join(map(str, test)))
+                tuning["healthcheck"] = {"test": [str(arg) for arg in test]}
+            else:
+                tuning["healthcheck"] = {"test": check("test", test or "")}
+            for key in HEALTHCHECK_KEYS[1:]:
+                if health.get(key) is not None:
+                    tuning["healthcheck"][key] = check(key, health[key])
+        details.update(tuning)
+
+    def print_infos(self):
+        lines = [f"Service '{self.name}':"]
+        for k, v in self.service_details.items():
+            if k == "networks":
+                if not v:
+                    lines.append(f"  networks: []")
+                else:
+                    lines.append("  networks:")
+                    for name, ip in v.items():
+                        if ip:
+                            lines.append(f"    {name}: ipv4_address={ip}")
+                        else:
+                            lines.append(f"    {name}")
+            elif k == "volumes":
+                if not v:
+                    lines.append("  volumes: []")
+                else:
+                    lines.append("  volumes:")
+                    for vol in v:
+                        if isinstance(vol, dict):
+                            lines.append(f"    - type={vol.get('type')} source={vol.get('source')} target={vol.get('target')}")
+                        else:
+                            # fallback for legacy string entries
+                            lines.append(f"    - {vol}")
+            elif k in TUNING_FIELDS and not v:
+                continue
+            else:
+                lines.append(f"  {k}: {v}")
+        return "\n".join(lines)
+
+    def needs_build(self):
+        # imported services answer from their raw block, without being parsed
+        if self._lazy is not None:
+            return "\n    build:" in self._lazy[0]
+        return self.service_details.get("image") == "auto"
+
+    def write_docker_format(self, out):
+        # stream the service fragment straight into a text stream
+        details = self.service_details
+        write = out.write
+        write(f"  {self.name}:\n")
+        # container_name if provided
+        if details.get("container_name"):
+            write(f"    container_name: {details['container_name']}\n")
+        # image first; auto builds the Dockerfile generated next to the compose file
+        if details.get("image") == "auto":
+            write("    build:\n      context: .\n")
+        elif details.get("image"):
+            write(f"    image: {details['image']}\n")
+        # ports
+        if details.get("ports"):
+            write("    ports:\n")
+            for p in details["ports"]:
+                write(f"      - \"{p}\"\n")
+        # expose
+        if details.get("expose"):
+            write("    expose:\n")
+            for ex in details["expose"]:
+                write(f"      - \"{ex}\"\n")
+        # volumes (service-level)
+        if details.get("volumes"):
+            write("    volumes:\n")
+            for vol in details["volumes"]:
+                # support structured dicts and legacy string entries
+                if isinstance(vol, dict):
+                    src = vol.get("source")
+                    tgt = vol.get("target")
+                    # long syntax could be used for bind, but keep short syntax for readability
+                    write(f"      - \"{src}:{tgt}\"\n")
+                else:
+                    write(f"      - \"{vol}\"\n")
+        # environment
+        if details.get("environment"):
+            write("    environment:\n")
+            for k, v in details["environment"].items():
+                write(f"      {k}: \"{v}\"\n")
+        # depends_on: long form as soon as one dependency has a condition
+        if details.get("depends_on"):
+            write("    depends_on:\n")
+            conditions = details.get("depends_on_conditions")
+            for d in details["depends_on"]:
+                if conditions:
+                    write(f"      {d}:\n        condition: {conditions.get(d, 'service_started')}\n")
+                else:
+                    write(f"      - {d}\n")
+        # command
+        if details.get("command"):
+            write(f"    command: \"{details['command']}\"\n")
+        # networks: support list or mapping with ipv4_address
+        nets = details.get("networks", {})
+        if nets:
+            write("    networks:\n")
+            # if any network has an IP, export as mapping; otherwise export as list
+            if any(ip for ip in nets.values()):
+                for name, ip in nets.items():
+                    if ip:
+                        write(f"      {name}:\n")
+                        write(f"        ipv4_address: \"{ip}\"\n")
+                    else:
+                        # empty mapping for networks without specified IP
+                        write(f"      {name}: {{}}\n")
+            else:
+                for name in nets.keys():
+                    write(f"      - {name}\n")
+        # restart
+        if details.get("restart"):
+            write(f"    restart: {details['restart']}\n")
+        # performance tuning
+        if details.get("resources"):
+            write("    deploy:\n      resources:\n")
+            for section in ("limits", "reservations"):
+                keys = [k for k in RESOURCE_KEYS if k.startswith(section) and k in details["resources"]]
+                if keys:
+                    write(f"        {section}:\n")
+                    for key in keys:
+                        write(f"          {key.partition('.')[2]}: \"{details['resources'][key]}\"\n")
+        if details.get("ulimits"):
+            write("    ulimits:\n")
+            for name, limits in details["ulimits"].items():
+                soft, _, hard = limits.partition(":")
+                if hard:
+                    write(f"      {name}:\n        soft: {soft}\n        hard: {hard}\n")
+                else:
+                    write(f"      {name}: {soft}\n")
+        if details.get("shm_size"):
+            write(f"    shm_size: \"{details['shm_size']}\"\n")
+        if details.get("tmpfs"):
+            write("    tmpfs:\n")
+            for mount in details["tmpfs"]:
+                write(f"      - \"{mount}\"\n")
+        if details.get("sysctls"):
+            write("    sysctls:\n")
+            for k, v in details["sysctls"].items():
+                write(f"      {k}: \"{v}\"\n")
+        if details.get("cpuset"):
+            write(f"    cpuset: \"{details['cpuset']}\"\n")
+        if details.get("healthcheck"):
+            write("    healthcheck:\n")
+            for key in HEALTHCHECK_KEYS:
+                value = details["healthcheck"].get(key)
+                if value:
+                    write(f"      {key}: {_yaml_value(value) if key == 'test' else value}\n")
+
+
+# Network class for network configuration/export
+class Network(CachedRender):
+    __slots__ = ("name", "driver", "subnet", "gateway", "ip_range", "app")
+    _render_fields = ("name", "driver", "subnet", "gateway", "ip_range")
+
+    def __init__(self, name):
+        self.name = name
+        self.driver = "bridge"
+        self.subnet = ""
+        self.gateway = ""   # ipam gateway (docker uses the first host when empty)
+        self.ip_range = ""  # sub-range used for automatic addresses
+        self.app = None  # will be injected
+
+    def configure_interactive(self):
+        app = self.app
+        drv = app.p_input(f"Driver for network '{self.name}' (default '{self.driver}'): ").strip()
+        if drv:
+            self.driver = drv
+        # each answer is validated against the previous ones before moving on
+        prompts = (
+            ("subnet", "Subnet (CIDR) (leave blank to skip): "),
+            ("gateway", "Gateway (leave blank for the first address): "),
+            ("ip_range", "IP range for automatic addresses (CIDR, leave blank for the whole subnet): "),
+        )
+        ipam = {}
+        for key, prompt in prompts:
+            while True:
+                value = app.p_input(prompt).strip()
+                if not value:
+                    break
+                try:
+                    IPv4Allocator(**{**ipam, key: value})
+                except ValueError as e:
+                    app.p_warn(f"{e}. Try again.")
+                    continue
+                ipam[key] = value
+                break
+            if not ipam:
+                break  # no subnet: gateway and ip_range make no sense
+        if ipam:
+            self.subnet = ipam["subnet"]
+            self.gateway = ipam.get("gateway", "")
+            self.ip_range = ipam.get("ip_range", "")
+
+    def apply_spec(self, spec):
+        unknown = set(spec) - {"driver", "subnet", "gateway", "ip_range"}
+        if unknown:
+            raise ValueError(f"network '{self.name}': unknown field(s) {', '.join(sorted(unknown))}")
+        if spec.get("driver"):
+            self.driver = str(spec["driver"])
+        for key in ("subnet", "gateway", "ip_range"):
+            if spec.get(key):
+                setattr(self, key, str(spec[key]))
+        if self.subnet:
+            try:
+                IPv4Allocator(self.subnet, self.gateway, self.ip_range)
+            except ValueError as e:
+                raise ValueError(f"network '{self.name}': {e}") from None
+        elif self.gateway or self.ip_range:
+            raise ValueError(f"network '{self.name}': gateway/ip_range need a subnet")
+
+    def to_spec(self):
+        return {"driver": self.driver, "subnet": self.subnet, "gateway": self.gateway, "ip_range": self.ip_range}
+
+    def print_infos(self):
+        infos = f"Network '{self.name}': driver={self.driver}, subnet={self.subnet}"
+        if self.gateway:
+            infos += f", gateway={self.gateway}"
+        if self.ip_range:
+            infos += f", ip_range={self.ip_range}"
+        return infos
+
+    def write_docker_format(self, out):
+        write = out.write
+        write(f"  {self.name}:\n")
+        if self.driver:
+            write(f"    driver: {self.driver}\n")
+        # Build ipam config only if we have subnet or gateway
+        if self.subnet:
+            write("    ipam:\n")
+            write("      config:\n")
+            write("        -\n")
+            write(f"          subnet: {self.subnet}\n")
+            if self.gateway:
+                write(f"          gateway: {self.gateway}\n")
+            if self.ip_range:
+                write(f"          ip_range: {self.ip_range}\n")
+
+
+def _command_keys(commands):
+    # "add service" -> add_service, plus the aliases
+    keys = {}
+    for entry in commands:
+        keys[entry[0].replace(" ", "_")] = entry
+        for alias in entry[1]:
+            keys[alias] = entry
+    return keys
 
-# initialize colorama (autoreset to avoid manual resets)
-colorama_init(autoreset=True)
 
 class App:
-    def __init__(self, path=None):
+    def __init__(self, path=None, quiet=False):
         self.name = "MagiCompose"
         self.version = "1.5.6"
         self.author = "Your Name"
         self.description = "An application for magical docker compose creation cli-like."
         self.license = "MIT"
         self.file = Path(path)
-        self.services = []
-        self.networks = []
-
-        # small helpers for colored output / prompts
-        def _color(text, color):
-            return f"{color}{text}{Style.RESET_ALL}"
-
-        self._color = _color
-        self.prompt_color = Fore.CYAN
-        self.info_color = Fore.GREEN
-        self.warn_color = Fore.YELLOW
-        self.err_color = Fore.RED
-        self.accent_color = Fore.MAGENTA
-
-        def p_input(prompt_text):
-            return input(self._color(prompt_text, self.prompt_color))
-
-        def p_info(text):
-            print(self._color(text, self.info_color))
-
-        def p_warn(text):
-            print(self._color(text, self.warn_color))
-
-        def p_err(text):
-            print(self._color(text, self.err_color))
-
-        def p_accent(text):
-            print(self._color(text, self.accent_color))
-
-        self.p_input = p_input
-        self.p_info = p_info
-        self.p_warn = p_warn
-        self.p_err = p_err
-        self.p_accent = p_accent
-
-        # Service class for service configuration/export
-        class Service:
-            def __init__(self, file, name):
-                self.file = file
-                self.name = name
-                self.service_details = {
-                    "image": "auto",
-                    "container_name": "",   # new: allow explicit container_name
-                    "ports": [],
-                    "expose": [],           # new: container-only exposed ports
-                    "volumes": [],
-                    "environment": {},  # dict
-                    "depends_on": [],
-                    "command": "",
-                    "networks": {},  # dict: network_name -> ipv4_address (empty string if none)
-                    "restart": "no"
-                }
-                # app reference will be injected by App when created (svc.app = self_app)
-                self.app = None
-
-            def configure_interactive(self, available_networks=None):
-                available_networks = available_networks or []
-                app = self.app  # local shortcut; required for colored I/O
-
-                image = app.p_input(f"Image for '{self.name}' (default '{self.service_details['image']}'): ").strip()
-                if image:
-                    self.service_details["image"] = image
-
-                # new: custom container name
-                cname = app.p_input("Container name (leave blank to skip): ").strip()
-                if cname:
-                    self.service_details["container_name"] = cname
-
-                # If image appears to be MySQL, offer quick MySQL env setup
-                if "mysql" in self.service_details["image"].lower():
-                    app.p_accent("Detected MySQL image. Optionally set MySQL environment variables (leave blank to skip each).")
-                    mysql_defaults = {
-                        "MYSQL_ROOT_PASSWORD": "rootpassword",
-                        "MYSQL_DATABASE": "demo",
-                        "MYSQL_USER": "user",
-                        "MYSQL_PASSWORD": "password"
-                    }
-                    for k, suggested in mysql_defaults.items():
-                        v = app.p_input(f"{k} (suggested '{suggested}'): ").strip()
-                        if v:
-                            self.service_details["environment"][k] = v
-
-                # Ports
-                app.p_info("Enter port mappings (host:container). Leave blank to finish.")
-                while True:
-                    p = app.p_input("Port mapping: ").strip()
-                    if not p:
-                        break
-                    self.service_details["ports"].append(p)
+        self.services = Registry(refs=service_refs)
+        self.networks = Registry()
+        self.quiet = quiet  # batch mode: silence informational output
+        self._last_export = None  # (render signature, stat of the file we wrote)
+        self.state = None  # ProjectState once open_state() is called
+        self._allocators = {}  # network name -> IPv4Allocator, built on first use
+        self._ports = None  # PortIndex, built on first use
+        self._readline = None  # readline module while the interactive loop completes
+        self.stats = CommandStats()  # main() swaps in one writing JSON lines when asked to
+        self.dedup = False  # export repeated service blocks once, as x- anchors (write_deduplicated)
 
-                # Expose (container-only ports)
-                app.p_info("Enter exposed ports (container-only, e.g. 8080). Leave blank to finish.")
-                while True:
-                    ex = app.p_input("Expose port: ").strip()
-                    if not ex:
-                        break
-                    self.service_details["expose"].append(ex)
+    # kept for callers using app.Service(...) / app.Network(...)
+    Service = Service
+    Network = Network
 
-                # Volumes
-                app.p_info("Add volumes. Choose type 'bind' for host bind (HOST_PATH -> CONTAINER_PATH) or 'named' for named volume (VOLUME_NAME -> CONTAINER_PATH). Leave type blank to finish.")
-                while True:
-                    vol_type = app.p_input("Volume type (bind/named, leave blank to finish): ").strip().lower()
-                    if not vol_type:
-                        break
-                    if vol_type not in ("bind", "named"):
-                        app.p_warn("Invalid type. Use 'bind' or 'named'.")
-                        continue
-                    src = app.p_input("Host path (for bind) or volume name (for named): ").strip()
-                    if not src:
-                        app.p_warn("Source/name required. Skipping this entry.")
-                        continue
-                    tgt = app.p_input("Container path (e.g. /data): ").strip()
-                    if not tgt:
-                        app.p_warn("Container path required. Skipping this entry.")
-                        continue
-                    # store structured volume info
-                    self.service_details["volumes"].append({
-                        "type": vol_type,
-                        "source": src,
-                        "target": tgt
-                    })
-
-                # Environment variables
-                app.p_info("Enter environment variables as KEY=VALUE. Leave blank to finish.")
-                while True:
-                    e = app.p_input("Env: ").strip()
-                    if not e:
-                        break
-                    if "=" in e:
-                        k, v = e.split("=", 1)
-                        self.service_details["environment"][k.strip()] = v.strip()
-                    else:
-                        app.p_warn("Invalid format. Use KEY=VALUE.")
+    # small helpers for colored output / prompts
+    @staticmethod
+    def _color(text, color):
+        palette = _palette()
+        if not palette[color]:
+            return text
+        return f"{palette[color]}{text}{palette['reset']}"
 
-                # depends_on
-                app.p_info("Enter dependent service names. Leave blank to finish.")
-                while True:
-                    d = app.p_input("Depends on service: ").strip()
-                    if not d:
-                        break
-                    self.service_details["depends_on"].append(d)
-
-                # Command
-                cmd = app.p_input("Command to run (leave blank to skip): ").strip()
-                if cmd:
-                    self.service_details["command"] = cmd
-
-                # Networks selection (supports name or name=ipv4_address)
-                if available_networks:
-                    app.p_accent("Available networks: " + ", ".join(available_networks))
-                app.p_info("Enter network names to attach this service to. You can specify an IP with 'name=ipv4_address'. Leave blank to finish.")
-                while True:
-                    n = app.p_input("Network (or name=ip): ").strip()
-                    if not n:
-                        break
-                    if "=" in n:
-                        name, ip = n.split("=", 1)
-                        name = name.strip()
-                        ip = ip.strip()
-                        if name:
-                            self.service_details["networks"][name] = ip
-                    else:
-                        self.service_details["networks"][n] = ""
-
-                # Restart policy
-                restart = app.p_input("Restart policy (no, always, on-failure, unless-stopped) [no]: ").strip()
-                if restart:
-                    self.service_details["restart"] = restart
-
-            def print_infos(self):
-                lines = [f"Service '{self.name}':"]
-                for k, v in self.service_details.items():
-                    if k == "networks":
-                        if not v:
-                            lines.append(f"  networks: []")
-                        else:
-                            lines.append("  networks:")
-                            for name, ip in v.items():
-                                if ip:
-                                    lines.append(f"    {name}: ipv4_address={ip}")
-                                else:
-                                    lines.append(f"    {name}")
-                    elif k == "volumes":
-                        if not v:
-                            lines.append("  volumes: []")
-                        else:
-                            lines.append("  volumes:")
-                            for vol in v:
-                                if isinstance(vol, dict):
-                                    lines.append(f"    - type={vol.get('type')} source={vol.get('source')} target={vol.get('target')}")
-                                else:
-                                    # fallback for legacy string entries
-                                    lines.append(f"    - {vol}")
-                    else:
-                        lines.append(f"  {k}: {v}")
-                return "\n".join(lines)
-
-            def export_to_docker_format(self):
-                s = f"  {self.name}:\n"
-                # container_name if provided
-                if self.service_details.get("container_name"):
-                    s += f"    container_name: {self.service_details['container_name']}\n"
-                # image first
-                if self.service_details.get("image"):
-                    s += f"    image: {self.service_details['image']}\n"
-                # ports
-                if self.service_details.get("ports"):
-                    s += "    ports:\n"
-                    for p in self.service_details["ports"]:
-                        s += f"      - \"{p}\"\n"
-                # expose
-                if self.service_details.get("expose"):
-                    s += "    expose:\n"
-                    for ex in self.service_details["expose"]:
-                        s += f"      - \"{ex}\"\n"
-                # volumes (service-level)
-                if self.service_details.get("volumes"):
-                    s += "    volumes:\n"
-                    for vol in self.service_details["volumes"]:
-                        # support structured dicts and legacy string entries
-                        if isinstance(vol, dict):
-                            src = vol.get("source")
-                            tgt = vol.get("target")
-                            # long syntax could be used for bind, but keep short syntax for readability
-                            s += f"      - \"{src}:{tgt}\"\n"
-                        else:
-                            s += f"      - \"{vol}\"\n"
-                # environment
-                if self.service_details.get("environment"):
-                    s += "    environment:\n"
-                    for k, v in self.service_details["environment"].items():
-                        s += f"      {k}: \"{v}\"\n"
-                # depends_on
-                if self.service_details.get("depends_on"):
-                    s += "    depends_on:\n"
-                    for d in self.service_details["depends_on"]:
-                        s += f"      - {d}\n"
-                # command
-                if self.service_details.get("command"):
-                    s += f"    command: \"{self.service_details['command']}\"\n"
-                # networks: support list or mapping with ipv4_address
-                nets = self.service_details.get("networks", {})
-                if nets:
-                    # if any network has an IP, export as mapping; otherwise export as list
-                    if any(ip for ip in nets.values()):
-                        s += "    networks:\n"
-                        for name, ip in nets.items():
-                            if ip:
-                                s += f"      {name}:\n"
-                                s += f"        ipv4_address: \"{ip}\"\n"
-                            else:
-                                # empty mapping for networks without specified IP
-                                s += f"      {name}: {{}}\n"
-                    else:
-                        s += "    networks:\n"
-                        for name in nets.keys():
-                            s += f"      - {name}\n"
-                # restart
-                if self.service_details.get("restart"):
-                    s += f"    restart: {self.service_details['restart']}\n"
-                return s
-
-        # Network class for network configuration/export
-        class Network:
-            def __init__(self, name):
-                self.name = name
-                self.driver = "bridge"
-                self.subnet = ""
-                self.app = None  # will be injected
-
-            def configure_interactive(self):
-                app = self.app
-                drv = app.p_input(f"Driver for network '{self.name}' (default '{self.driver}'): ").strip()
-                if drv:
-                    self.driver = drv
-                sn = app.p_input("Subnet (CIDR) (leave blank to skip): ").strip()
-                if sn:
-                    self.subnet = sn
-
-            def print_infos(self):
-                return f"Network '{self.name}': driver={self.driver}, subnet={self.subnet}"
-
-            def export_to_docker_format(self):
-                s = f"  {self.name}:\n"
-                if self.driver:
-                    s += f"    driver: {self.driver}\n"
-                # Build ipam config only if we have subnet or gateway
-                if self.subnet:
-                    s += "    ipam:\n"
-                    s += "      config:\n"
-                    s += "        -\n"
-                    s += f"          subnet: {self.subnet}\n"
-                return s
-
-        # expose inner classes
-        self.Service = Service
-        self.Network = Network
-
-    def export_compose(self):
-        # Build YAML content
-        out = "version: '3.8'\nservices:\n"
-        for svc in self.services:
-            out += svc.export_to_docker_format()
+    def p_input(self, prompt_text):
+        palette = _palette()
+        if self._readline is not None and palette["prompt"]:
+            # \001/\002 tell readline the color codes take no room on screen
+            prompt_text = f"\001{palette['prompt']}\002{prompt_text}\001{palette['reset']}\002"
+        else:
+            prompt_text = self._color(prompt_text, "prompt")
+        t0 = time.perf_counter()
+        try:
+            return input(prompt_text)
+        finally:
+            # so command timings can tell waiting for the user from work
+            self.stats.input_seconds += time.perf_counter() - t0
+
+    def p_info(self, text):
+        if self.quiet:
+            return
+        print(self._color(text, "info"))
+
+    def p_warn(self, text):
+        print(self._color(text, "warn"))
+
+    def p_err(self, text):
+        print(self._color(text, "err"))
+
+    def p_accent(self, text):
+        print(self._color(text, "accent"))
+
+    def load_spec(self, spec):
+        """Populate services and networks from a spec mapping, without prompting."""
+        for name, cfg in (spec.get("networks") or {}).items():
+            net = self.Network(name)
+            net.app = self
+            net.apply_spec(cfg or {})
+            self.add_network(net)
+        for name, cfg in (spec.get("services") or {}).items():
+            svc = self.Service(self.file, name)
+            svc.app = self
+            svc.apply_spec(cfg or {})
+            self.add_service(svc)
+        # references are resolved once everything is loaded (order in the spec is free)
+        problems = [p for svc in self.services for p in self.unresolved_references(svc)]
+        cycle = DependencyGraph(self.services).find_cycle()
+        if cycle:
+            problems.append("dependency cycle: " + " -> ".join(cycle))
+        if problems:
+            raise ValueError("; ".join(problems))
+
+    def write_compose(self, out):
+        """Render the whole compose document into a text stream, one fragment at a time."""
+        dedup = None
+        if self.dedup:
+            out.write("version: '3.8'\n")
+            dedup = self.write_deduplicated(out)
+            named_volumes = dedup["named_volumes"]
+        else:
+            out.write("version: '3.8'\nservices:\n")
+            # collect named volumes while services are streamed (single pass)
+            named_volumes = set()
+            for svc in self.services:
+                out.write(svc.render())
+                named_volumes.update(svc.named_volumes())
         if self.networks:
-            out += "networks:\n"
+            out.write("networks:\n")
             for net in self.networks:
-                out += net.export_to_docker_format()
-        # collect named volumes from services and add top-level volumes section
-        named_volumes = set()
-        for svc in self.services:
-            for vol in svc.service_details.get("volumes", []):
-                if isinstance(vol, dict) and vol.get("type") == "named":
-                    named_volumes.add(vol.get("source"))
+                out.write(net.render())
+        # top-level volumes section for named volumes
         if named_volumes:
-            out += "volumes:\n"
+            out.write("volumes:\n")
             for name in sorted(named_volumes):
-                out += f"  {name}:\n"
-        # Write to file
+                out.write(f"  {name}:\n")
+        return dedup
+
+    def write_deduplicated(self, out):
+        """Write x- anchors for the service blocks used more than once, then the services aliasing them.
+
+        Multi-line fields (environment, volumes, healthcheck, ...) identical in
+        several services become ``x-<field>-<n>: &<field>-<n>`` and are written
+        as ``<field>: *<field>-<n>``; a shared set of scalar fields (image,
+        restart, ...) becomes ``x-common-<n>`` pulled in with a ``<<:`` merge
+        key. Anchors are numbered in order of first use, so the output only
+        depends on the project. Returns sizes and the named volumes.
+        """
+        services = []  # (header, blocks, merged scalar lines or None)
+        counts = {}
+        named_volumes = set()
+        plain = 0
+        for svc in self.services:
+            fragment = svc.render()
+            plain += len(fragment)
+            named_volumes.update(svc.named_volumes())
+            header, blocks = _field_blocks(fragment)
+            scalars = tuple(b for b in blocks if b.count("\n") == 1 and _block_field(b) in DEDUP_SCALARS)
+            scalars = scalars if len(scalars) > 1 else None
+            for key in [b for b in blocks if b.count("\n") > 1] + ([scalars] if scalars else []):
+                counts[key] = counts.get(key, 0) + 1
+            services.append((header, blocks, scalars))
+
+        anchors = {}  # shared block (or scalar tuple) -> anchor name
+        numbers = {}  # field -> anchors handed out
+        written = 0
+        for _, blocks, scalars in services:
+            for key in [b for b in blocks if b.count("\n") > 1] + ([scalars] if scalars else []):
+                if counts[key] < 2 or key in anchors:
+                    continue
+                field = "common" if isinstance(key, tuple) else _block_field(key)
+                name = f"{field}-{numbers.get(field, 0) + 1}"
+                # bodies at the service-field indent (4), whatever they were under the field
+                body = "".join(key) if isinstance(key, tuple) else "".join(
+                    line[2:] for line in key.splitlines(True)[1:])
+                text = f"x-{name}: &{name}\n{body}"
+                alias = f"    {'<<' if field == 'common' else field}: *{name}\n"
+                if len(text) + counts[key] * len(alias) >= counts[key] * len("".join(key)):
+                    continue  # small block, few users: the anchor would cost more than it saves
+                numbers[field] = numbers.get(field, 0) + 1
+                anchors[key] = name
+                out.write(text)
+                written += len(text)
+
+        out.write("services:\n")
+        for header, blocks, scalars in services:
+            parts = [header]
+            merged = anchors.get(scalars) if scalars else None
+            if merged:
+                parts.append(f"    <<: *{merged}\n")
+            for block in blocks:
+                if merged and block in scalars:
+                    continue
+                name = anchors.get(block)
+                parts.append(f"    {_block_field(block)}: *{name}\n" if name else block)
+            text = "".join(parts)
+            out.write(text)
+            written += len(text)
+        return {"anchors": len(anchors), "plain_bytes": plain, "bytes": written, "named_volumes": named_volumes}
+
+    def render_signature(self):
+        """Cheap digest of the whole document, built from the per-fragment hashes."""
+        import hashlib
+        h = hashlib.sha256()
+        if self.dedup:
+            h.update(b"dedup")
+        for svc in self.services:
+            h.update(svc.digest)
+        h.update(b"|")
+        for net in self.networks:
+            h.update(net.digest)
+        return h.digest()
+
+    def content_digest(self):
+        sink = _HashSink()
+        self.write_compose(sink)
+        return sink.digest()
+
+    def print_graph(self, name=None, limit=20):
+        graph = DependencyGraph(self.services)
+        for svc_name, dep in graph.missing():
+            self.p_warn(f"'{svc_name}' depends on missing service '{dep}'")
+
+        def names(items):
+            shown = ", ".join(items[:limit])
+            return shown + (f" ... (+{len(items) - limit} more)" if len(items) > limit else "")
+
+        if name is not None:
+            if name not in graph.deps:
+                self.p_warn(f"Service '{name}' not found.")
+                return
+            deps = graph.dependencies(name)
+            dependents = graph.dependents(name)
+            self.p_info(f"'{name}' needs {len(deps)} service(s): {names(deps) or '-'}")
+            self.p_info(f"{len(dependents)} service(s) need '{name}': {names(dependents) or '-'}")
+            return
+        cycle = graph.find_cycle()
+        if cycle:
+            self.p_err("Dependency cycle: " + " -> ".join(cycle))
+            return
+        for i, wave in enumerate(graph.waves(), 1):
+            self.p_info(f"wave {i} ({len(wave)}): {names(wave)}")
+
+    def export_compose(self, dedup=None):
+        # dedup=True/False switches the export mode for this and later exports
+        if dedup is not None:
+            self.dedup = dedup
+        with self.stats.measure("export_compose", bytes_written=0) as record:
+            rendered = self.Service.renders
+            try:
+                written = self._export_compose(record)
+            finally:
+                record["services_rendered"] = self.Service.renders - rendered
+            if written:
+                with self.stats.measure("export_compose.build_files"):
+                    self.write_build_files()
+            return written
+
+    def write_build_files(self):
+        """Generate the Dockerfile and .dockerignore built by the image auto services.
+
+        The project type (Go, Node, Python) comes from the files next to the
+        compose file. Files without the generated marker are the user's and
+        are never touched, and a user Dockerfile gets no generated
+        .dockerignore either (it could exclude what that Dockerfile copies);
+        generated files are only rewritten when they change. Returns the
+        paths written.
+        """
+        builds = sum(1 for svc in self.services if svc.needs_build())
+        if not builds:
+            return []
+        directory = self.file.parent
+        kind, names = detect_project(directory)
+        if kind is None:
+            if "Dockerfile" not in names:
+                self.p_warn(f"{builds} service(s) use image 'auto' but no Go/Node/Python project was found in "
+                            f"{directory.resolve()}: add a Dockerfile there or set an image")
+            return []
+        dockerfile = directory / "Dockerfile"
+        if "Dockerfile" in names and not _generated(dockerfile.read_text(encoding="utf-8")):
+            self.p_info(f"image 'auto' services build the existing {dockerfile.resolve()}")
+            return []
+        written = []
+        for name, text in (("Dockerfile", render_dockerfile(kind, names, directory)),
+                           (".dockerignore", render_dockerignore(kind, self.file.name))):
+            path = directory / name
+            if name in names:
+                current = path.read_text(encoding="utf-8")
+                if current == text or not _generated(current):
+                    continue
+            path.write_text(text, encoding="utf-8")
+            written.append(path)
+            self.p_info(f"{name} for the {kind} project written to {path.resolve()}")
+        return written
+
+    def _export_compose(self, record):
+        target = self.file
+        # skip the write (and file watcher churn) when the file already holds this content
+        with self.stats.measure("export_compose.check"):
+            signature = self.render_signature()
+            disk = _stat_signature(target)
+            unchanged = disk is not None and (
+                self._last_export == (signature, disk)
+                or _file_digest(target) == self.content_digest()
+            )
+        if unchanged:
+            self._last_export = (signature, disk)
+            self.p_info(f"docker-compose file unchanged, not rewritten ({target.resolve()})")
+            return True
+        # stream into a temp file next to the target, then rename it atomically
+        import tempfile
+        tmp_name = None
         try:
-            self.file.write_text(out, encoding="utf-8")
-            self.p_info(f"docker-compose file written to {self.file.resolve()}")
+            fd, tmp_name = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".tmp", dir=str(target.parent))
+            with self.stats.measure("export_compose.write"), \
+                    os.fdopen(fd, "w", encoding="utf-8", buffering=1 << 16) as out:
+                dedup = self.write_compose(out)
+                out.flush()
+                os.fsync(out.fileno())
+            # mkstemp creates 0600 files; keep the permissions write_text would have used
+            try:
+                mode = target.stat().st_mode & 0o777
+            except FileNotFoundError:
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            os.chmod(tmp_name, mode)
+            os.replace(tmp_name, target)
+            tmp_name = None
+            self._last_export = (signature, _stat_signature(target))
+            record["bytes_written"] = self._last_export[1][0]
+            self.p_info(f"docker-compose file written to {target.resolve()}")
+            if dedup:
+                saved = dedup["plain_bytes"] - dedup["bytes"]
+                record["bytes_saved"] = saved
+                self.p_info(f"{dedup['anchors']} shared blocks written once: services section "
+                            f"{dedup['plain_bytes'] / 1024:.1f} KiB -> {dedup['bytes'] / 1024:.1f} KiB "
+                            f"({saved / max(dedup['plain_bytes'], 1):.0%} smaller)")
+            return True
         except Exception as e:
             self.p_err(f"Error writing file: {e}")
+            return False
+        finally:
+            # never leave half-written temp files behind
+            if tmp_name is not None:
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
 
     def clear(self):
         """Clear the terminal screen (Linux/Unix)."""
@@ -347,125 +1727,1323 @@ class App:
 
     # helpers to find existing service/network by name
     def get_service(self, name: str):
-        for svc in self.services:
-            if svc.name == name:
-                return svc
-        return None
+        return self.services.get(name)
 
     def get_network(self, name: str):
-        for net in self.networks:
-            if net.name == name:
-                return net
-        return None
+        return self.networks.get(name)
 
-    def loop(self):
-        self.p_accent(f"Welcome to {self.name} v{self.version}!")
-        while True:
-            command = self.p_input("Enter command (add service, show services, add network, show networks, edit service <name>, edit network <name>, clear, export, exit): ").strip()
-            if not command:
-                continue
-            tokens = command.split()
+    def add_service(self, svc):
+        if svc.name in self.services:
+            raise ValueError(f"'{svc.name}' already exists")
+        self.assign_addresses(svc)
+        try:
+            self.bind_ports(svc)
+        except ValueError:
+            self._release_addresses(svc.service_details, svc.name)
+            raise
+        return self._register(svc)
 
-            # clear screen
-            if command in ("clear", "c"):
-                self.clear()
-                continue
+    def _register(self, svc):
+        # addresses and ports are already reserved
+        self.services.add(svc)
+        self._journal("add_service", name=svc.name, details=svc.service_details)
+        return svc
 
-            # Edit service: formats supported
-            #   edit service <name>
-            #   edit_service <name>
-            #   es <name>
-            if (tokens[0] in ("edit_service", "edit-service", "es")) or (tokens[0] == "edit" and len(tokens) > 1 and tokens[1] == "service"):
-                # determine service name position
-                if tokens[0] in ("edit_service", "edit-service", "es"):
-                    svc_name = tokens[1] if len(tokens) > 1 else ""
-                else:
-                    svc_name = tokens[2] if len(tokens) > 2 else ""
-                if not svc_name:
-                    self.p_warn("Service name required. Usage: edit service <name> | edit_service <name> | es <name>")
-                    continue
-                svc = self.get_service(svc_name)
-                if not svc:
-                    self.p_warn(f"Service '{svc_name}' not found.")
+    def add_network(self, net):
+        self.networks.add(net)
+        self._journal("add_network", name=net.name, fields=net.to_spec())
+        return net
+
+    def update_service(self, svc, before):
+        """Commit an in-place edit of `svc`; `before` is a copy of its details taken before the edit.
+
+        Only the service's own old host ports and addresses are released before
+        the new ones are checked. On ValueError the old details (and their
+        reservations) are put back and nothing is journaled.
+        """
+        name = svc.name
+        # built now, without this service, if nothing used the index yet
+        index = self.port_index(skip=name)
+        self._release_addresses(before, name)
+        for binding in self._bindings(before):
+            index.remove(binding, name)
+        try:
+            self.assign_addresses(svc)
+            try:
+                self.bind_ports(svc)
+            except ValueError:
+                self._release_addresses(svc.service_details, name)
+                raise
+        except ValueError:
+            svc.service_details = before
+            svc.invalidate()
+            self._restore_reservations(svc)
+            raise
+        svc.invalidate()
+        self.services.reindex(name)
+        self._journal("edit_service", name=name, details=svc.service_details)
+
+    def _restore_reservations(self, svc):
+        # rollback: take back what the service held, without checking it again (a
+        # check could fail halfway); ports first, they do not depend on the networks
+        index = self.port_index()
+        for binding in self._bindings(svc.service_details):
+            try:
+                index.add(binding, svc.name)
+            except ValueError:
+                pass
+        for net_name, ip in svc.service_details.get("networks", {}).items():
+            alloc = self._allocators.get(net_name)
+            if ip and ip != "auto" and alloc is not None:
+                try:
+                    alloc.reserve(ip, svc.name)
+                except ValueError:
+                    pass
+
+    def update_network(self, net, before):
+        """Commit an in-place edit of `net`; `before` is its to_spec() from before the edit.
+
+        The edit is rejected with ValueError (old fields back, nothing
+        journaled) when the attached services' static addresses do not fit
+        the new subnet/gateway/ip_range.
+        """
+        old = self._allocators.pop(net.name, None)
+        try:
+            if net.subnet:
+                problems = self.allocator(net.name).problems
+            else:
+                problems = []
+                for ref in self.services.referrers("networks", net.name):
+                    ip = self.services.get(ref).service_details["networks"].get(net.name)
+                    if ip:
+                        problems.append(f"service '{ref}' has the static address {ip}, it needs a subnet")
+        except ValueError as e:
+            problems = [str(e)]
+        if problems:
+            for key, value in before.items():
+                setattr(net, key, value)
+            self._allocators.pop(net.name, None)
+            if old is not None:
+                self._allocators[net.name] = old
+            raise ValueError("; ".join(problems))
+        self._journal("edit_network", name=net.name, fields=net.to_spec())
+
+    # bulk generation
+    def replicate(self, template, count, pattern="{name}-{i}", start=1, env=None, static_ips=False):
+        """Create `count` copies of service `template` without prompting.
+
+        Names come from `pattern` ({name} is the template, {i} the replica
+        number); host ports move to the next free ones, `env` values are
+        formatted the same way, a container_name goes through `pattern` too
+        (compose needs them unique), and addresses are allocated on every network
+        where the template has one (on every network with a subnet when
+        `static_ips`). Returns the new services.
+        """
+        tpl = self.services.get(template)
+        if tpl is None:
+            raise ValueError(f"service '{template}' not found")
+        names = [pattern.format(name=template, i=i) for i in range(start, start + count)]
+        if len(set(names)) != len(names):
+            raise ValueError(f"pattern '{pattern}' does not give unique names")
+        taken = [name for name in names if name in self.services]
+        if taken:
+            raise ValueError(f"already defined: {', '.join(taken[:5])}{' ...' if len(taken) > 5 else ''}")
+        base = tpl.service_details
+        index = self.port_index()
+        port_plan = []  # (position, mapping parts, span, ip, proto) of ports published on the host
+        for pos, spec in enumerate(base.get("ports", [])):
+            binding = parse_port_binding(spec)
+            if binding:
+                ip, first, last, proto = binding
+                port_plan.append((pos, str(spec).rsplit(":", 2), last - first + 1, ip, proto))
+        cursors = [parse_port_binding(base["ports"][plan[0]])[1] for plan in port_plan]
+        auto_nets = [
+            name for name, ip in base.get("networks", {}).items()
+            if name in self.networks and (ip or (static_ips and self.networks.get(name).subnet))
+        ]
+
+        created = []
+        with self._bulk():
+            try:
+                for i, name in zip(range(start, start + count), names):
+                    details = _copy_details(base)
+                    if details.get("container_name"):
+                        details["container_name"] = pattern.format(name=base["container_name"], i=i)
+                    for key, value in (env or {}).items():
+                        details["environment"][key] = str(value).format(name=name, i=i)
+                    for net_name in auto_nets:
+                        details["networks"][net_name] = "auto"
+                    svc = self.Service.from_details(self.file, name, details)
+                    svc.app = self
+                    self.assign_addresses(svc)
+                    created.append(svc)
+                    # ports are picked (and held) one by one so a replica cannot collide with itself
+                    for n, (pos, parts, span, ip, proto) in enumerate(port_plan):
+                        host = index.next_free(cursors[n], span, ip, proto)
+                        index.add((ip, host, host + span - 1, proto), name)
+                        cursors[n] = host + span
+                        parts = parts[:]
+                        parts[-2] = f"{host}-{host + span - 1}" if span > 1 else str(host)
+                        details["ports"][pos] = ":".join(parts)
+                    self._register(svc)
+            except ValueError:
+                # all or nothing
+                for svc in reversed(created):
+                    if svc.name in self.services:
+                        self.delete_service(svc.name)
+                    else:
+                        self._release_addresses(svc.service_details, svc.name)
+                        for binding in self._bindings(svc.service_details):
+                            index.remove(binding, svc.name)
+                raise
+        return created
+
+    @contextlib.contextmanager
+    def _bulk(self):
+        # one snapshot at the end instead of one journal line per service
+        state, self.state = self.state, None
+        try:
+            yield
+        finally:
+            self.state = state
+            self.compact_state()
+
+    # host ports
+    def port_index(self, skip=None):
+        """PortIndex of every service's published host ports (built on first use)."""
+        if self._ports is None:
+            index = PortIndex()
+            for svc in self.services:
+                if svc.name == skip:
                     continue
-                # show current config and confirm
-                print(self._color(svc.print_infos(), Fore.WHITE))
-                ans = self.p_input("Edit this service? [y/N]: ").strip().lower()
-                if ans != "y":
-                    self.p_info("Edit cancelled.")
+                for spec in svc.service_details.get("ports", []):
+                    try:
+                        binding = parse_port_binding(spec)
+                        if binding:
+                            index.add(binding, svc.name)
+                    except ValueError as e:
+                        index.problems.append(f"service '{svc.name}': {e}")
+            for problem in index.problems:
+                self.p_warn(problem)
+            self._ports = index
+        return self._ports
+
+    def check_port(self, svc_name, spec):
+        """Error message if `spec` is invalid or its host ports are taken, else None."""
+        try:
+            if spec.startswith("auto:"):
+                _port_range(spec[len("auto:"):].partition("/")[0], spec)
+                return None
+            binding = parse_port_binding(spec)
+        except ValueError as e:
+            return str(e)
+        held = binding and self.port_index().conflict(binding, svc_name)
+        if held:
+            return _port_conflict(binding, held)
+        return None
+
+    def bind_ports(self, svc):
+        """Resolve 'auto:<port>' mappings and record the service's host ports (ValueError on conflict)."""
+        index = self.port_index()
+        ports = svc.service_details.get("ports", [])
+        bindings = []
+        for i, spec in enumerate(ports):
+            if str(spec).startswith("auto:"):
+                container = str(spec)[len("auto:"):]
+                proto = container.partition("/")[2] or "tcp"
+                first, last = _port_range(container.partition("/")[0], spec)
+                host = index.next_free(count=last - first + 1, proto=proto)
+                hosts = f"{host}-{host + last - first}" if last != first else str(host)
+                ports[i] = spec = f"{hosts}:{container}"
+                svc.invalidate()
+            binding = parse_port_binding(spec)
+            if binding:
+                try:
+                    index.add(binding, svc.name)
+                except ValueError as e:
+                    for done in bindings:
+                        index.remove(done, svc.name)
+                    raise ValueError(f"service '{svc.name}': {e}") from None
+                bindings.append(binding)
+
+    def _bindings(self, details):
+        bindings = []
+        for spec in details.get("ports", []):
+            try:
+                binding = parse_port_binding(spec)
+            except ValueError:
+                continue  # never indexed
+            if binding:
+                bindings.append(binding)
+        return bindings
+
+    def next_free_port(self, start=8000, count=1, ip="", proto="tcp"):
+        return self.port_index().next_free(start, count, ip, proto)
+
+    # static IPv4 addresses
+    def allocator(self, net_name):
+        """IPv4Allocator of a network (None without subnet), seeded with the attached services."""
+        alloc = self._allocators.get(net_name)
+        if alloc is None:
+            net = self.networks.get(net_name)
+            if net is None or not net.subnet:
+                return None
+            alloc = IPv4Allocator(net.subnet, net.gateway, net.ip_range)
+            alloc.problems = []
+            for ref in self.services.referrers("networks", net_name):
+                ip = self.services.get(ref).service_details["networks"].get(net_name)
+                if ip and ip != "auto":
+                    try:
+                        alloc.reserve(ip, ref)
+                    except ValueError as e:
+                        alloc.problems.append(f"service '{ref}' on '{net_name}': {e}")
+            self._allocators[net_name] = alloc
+        return alloc
+
+    def _release_addresses(self, details, name):
+        for net_name, ip in details.get("networks", {}).items():
+            alloc = self._allocators.get(net_name)
+            if ip and ip != "auto" and alloc is not None \
+                    and alloc.owners.get(int(ipaddress.IPv4Address(ip)) - alloc.base) == name:
+                alloc.release(ip)
+
+    def check_ipv4(self, svc_name, net_name, ip):
+        """Error message if `svc_name` may not use `ip` on `net_name`, else None."""
+        if ip == "auto" or net_name not in self.networks:
+            return None  # undefined networks are reported by unresolved_references
+        alloc = self.allocator(net_name)
+        if alloc is None:
+            return f"network '{net_name}' has no subnet, static addresses need one"
+        try:
+            alloc.check(ip, svc_name)
+        except ValueError as e:
+            return f"network '{net_name}': {e}"
+        return None
+
+    def assign_addresses(self, svc):
+        """Validate the service's static IPs, resolve 'auto' ones and reserve them all."""
+        nets = svc.service_details.get("networks", {})
+        for net_name, ip in nets.items():
+            problem = self.check_ipv4(svc.name, net_name, ip) if ip else None
+            if problem:
+                raise ValueError(f"service '{svc.name}': {problem}")
+        reserved = []  # (network, address, was auto) handed out so far, given back on failure
+        try:
+            for net_name, ip in nets.items():
+                if not ip or net_name not in self.networks:
                     continue
-                # run interactive configure again (it will use current values as defaults)
-                svc.configure_interactive(available_networks=[n.name for n in self.networks])
-                self.p_info(f"Service '{svc_name}' updated.")
-                continue
+                alloc = self.allocator(net_name)
+                if alloc is None:
+                    raise ValueError(f"service '{svc.name}': network '{net_name}' has no subnet, static addresses need one")
+                if ip == "auto":
+                    nets[net_name] = alloc.allocate(svc.name)
+                    svc.invalidate()
+                else:
+                    alloc.reserve(ip, svc.name)
+                reserved.append((net_name, nets[net_name], ip == "auto"))
+        except ValueError:
+            for net_name, ip, was_auto in reserved:
+                self._allocators[net_name].release(ip)
+                if was_auto:
+                    nets[net_name] = "auto"
+            raise
+
+    def unresolved_references(self, svc):
+        """Warnings for depends_on / network names that do not resolve."""
+        details = svc.service_details
+        problems = [f"depends_on '{d}' is not a defined service" for d in details.get("depends_on", []) if d not in self.services]
+        # 'default' is the implicit compose network
+        problems += [f"network '{n}' is not a defined network" for n in details.get("networks", {}) if n not in self.networks and n != "default"]
+        if svc.name in details.get("depends_on", []):
+            problems.append(f"service '{svc.name}' depends on itself")
+        # compose refuses to wait for the health of a service without a healthcheck
+        for dep, condition in (details.get("depends_on_conditions") or {}).items():
+            target = self.services.get(dep)
+            if condition == "service_healthy" and target is not None and not target.service_details.get("healthcheck"):
+                problems.append(f"'{svc.name}' waits for '{dep}' to be healthy but '{dep}' has no healthcheck")
+        return problems
 
-            # Edit network: formats supported
-            #   edit network <name>
-            #   edit_network <name>
-            #   en <name>
-            if (tokens[0] in ("edit_network", "edit-network", "en")) or (tokens[0] == "edit" and len(tokens) > 1 and tokens[1] == "network"):
-                if tokens[0] in ("edit_network", "edit-network", "en"):
-                    net_name = tokens[1] if len(tokens) > 1 else ""
+    def rename_service(self, old, new):
+        referrers = self.services.referrers("depends_on", old)
+        self.services.rename(old, new)
+        svc = self.services.get(new)
+        for net_name, ip in svc.service_details.get("networks", {}).items():
+            if ip and net_name in self._allocators:
+                self._allocators[net_name].rename_owner(ip, new)
+        if self._ports is not None:
+            for binding in self._bindings(svc.service_details):
+                self._ports.remove(binding, old)
+                self._ports.add(binding, new)
+        for ref in referrers:
+            deps = self.services.get(ref).service_details["depends_on"]
+            deps[:] = [new if d == old else d for d in deps]
+            conditions = self.services.get(ref).service_details.get("depends_on_conditions")
+            if conditions and old in conditions:
+                conditions[new] = conditions.pop(old)
+            self.services.get(ref).invalidate()
+            self.services.reindex(ref)
+        self._journal("rename_service", old=old, new=new)
+
+    def delete_service(self, name):
+        referrers = self.services.referrers("depends_on", name)
+        if referrers:
+            raise ValueError(f"service '{name}' is required by: {', '.join(referrers)}")
+        svc = self.services.remove(name)
+        self._release_addresses(svc.service_details, name)
+        if self._ports is not None:
+            for binding in self._bindings(svc.service_details):
+                self._ports.remove(binding, name)
+        self._journal("delete_service", name=name)
+        return svc
+
+    def rename_network(self, old, new):
+        attached = self.services.referrers("networks", old)
+        self.networks.rename(old, new)
+        if old in self._allocators:
+            self._allocators[new] = self._allocators.pop(old)
+        for ref in attached:
+            details = self.services.get(ref).service_details
+            # rebuild the mapping to keep the network's position
+            details["networks"] = {new if n == old else n: ip for n, ip in details["networks"].items()}
+            self.services.get(ref).invalidate()
+            self.services.reindex(ref)
+        self._journal("rename_network", old=old, new=new)
+
+    def delete_network(self, name):
+        attached = self.services.referrers("networks", name)
+        if attached:
+            raise ValueError(f"network '{name}' is used by: {', '.join(attached)}")
+        net = self.networks.remove(name)
+        self._allocators.pop(name, None)
+        self._journal("delete_network", name=name)
+        return net
+
+    # project state (snapshot + journal)
+    def open_state(self, directory=None):
+        """Restore the project saved in `directory` (default: .magicompose next to the compose file)."""
+        state = ProjectState(directory or self.file.parent / ".magicompose")
+        t0 = time.perf_counter()
+        snapshot, entries = state.load()
+        if snapshot:
+            for name, fields in snapshot.get("networks", []):
+                self.networks.add(self._restore_network(name, fields))
+            for name, details, *lazy in snapshot.get("services", []):
+                if details is None:
+                    # imported service never touched: still its raw block
+                    fragment, named = lazy
+                    svc = self.Service.from_fragment(self.file, name, fragment, set(named))
                 else:
-                    net_name = tokens[2] if len(tokens) > 2 else ""
-                if not net_name:
-                    self.p_warn("Network name required. Usage: edit network <name> | edit_network <name> | en <name>")
-                    continue
-                net = self.get_network(net_name)
-                if not net:
-                    self.p_warn(f"Network '{net_name}' not found.")
-                    continue
-                print(self._color(net.print_infos(), Fore.WHITE))
-                ans = self.p_input("Edit this network? [y/N]: ").strip().lower()
-                if ans != "y":
-                    self.p_info("Edit cancelled.")
+                    svc = self.Service.from_details(self.file, name, details)
+                svc.app = self
+                self.services.add(svc, defer_refs=True)
+        for entry in entries:
+            self._replay(entry)
+        self.state = state
+        if state.pending >= state.COMPACT_EVERY:
+            self.compact_state()
+        return {"services": len(self.services), "networks": len(self.networks),
+                "replayed": len(entries), "seconds": time.perf_counter() - t0}
+
+    def compact_state(self):
+        if self.state is None:
+            return
+        self.state.compact({
+            "services": [[svc.name, *svc.to_state()] for svc in self.services],
+            "networks": [[net.name, net.to_spec()] for net in self.networks],
+        })
+
+    def close_state(self):
+        if self.state is not None and self.state.pending:
+            self.compact_state()
+        if self.state is not None:
+            self.state.close()
+
+    def _journal(self, op, **payload):
+        if self.state is None:
+            return
+        self.state.append(op, **payload)
+        if self.state.pending >= self.state.COMPACT_EVERY:
+            self.compact_state()
+
+    def _restore_network(self, name, fields):
+        net = self.Network(name)
+        net.app = self
+        for key, value in fields.items():
+            setattr(net, key, value)
+        return net
+
+    def _replay(self, entry):
+        op = entry["op"]
+        if op == "add_service":
+            svc = self.Service.from_details(self.file, entry["name"], entry["details"])
+            svc.app = self
+            self.services.add(svc, defer_refs=True)
+        elif op == "edit_service":
+            self.services.get(entry["name"]).service_details = entry["details"]
+            self.services.reindex(entry["name"])
+        elif op == "add_network":
+            self.networks.add(self._restore_network(entry["name"], entry["fields"]))
+        elif op == "edit_network":
+            net = self.networks.get(entry["name"])
+            for key, value in entry["fields"].items():
+                setattr(net, key, value)
+        elif op in ("rename_service", "rename_network"):
+            # state is None while replaying, so these do not journal again
+            getattr(self, op)(entry["old"], entry["new"])
+        elif op in ("delete_service", "delete_network"):
+            getattr(self, op)(entry["name"])
+        else:
+            raise ValueError(f"unknown journal operation '{op}'")
+
+    def import_compose(self, path=None):
+        """Load a docker-compose.yml (as written by export_compose) in one streaming pass.
+
+        Networks are built right away; service blocks are kept as raw fragments
+        and only parsed when their details are first needed, so untouched
+        services are written back verbatim. Returns import statistics.
+        """
+        path = Path(path) if path else self.file
+        t0 = time.perf_counter()
+        # field names as written by export_compose (resources go under deploy, image auto is a build)
+        known = set(self.Service(self.file, "").service_details).union(TUNING_FIELDS, ["deploy", "build"])
+        blocks = []    # (name, fragment)
+        networks = []  # (name, {field: value})
+        named = set()
+        anchors = {}   # x- extension fields of a deduplicated export: anchor -> body
+        state = {"section": None, "line": 1}
+
+        def consume(text):
+            # text holds whole entries: top-level keys or 2-space indented blocks
+            if not text:
+                return
+            section = state["section"]
+            line = state["line"]
+            # the split eats the newline ending each entry; put it back
+            for entry in _ENTRY_RE.split(text[:-1] if text.endswith("\n") else text):
+                entry += "\n"
+                if not entry.strip() or entry.lstrip().startswith("#"):
+                    line += entry.count("\n")
                     continue
-                net.configure_interactive()
-                self.p_info(f"Network '{net_name}' updated.")
+                entry_lines = entry.count("\n")  # before any alias expansion
+                key = entry.partition(":")[0].strip()
+                if entry[0] != " ":
+                    if key in ("services", "networks", "volumes"):
+                        section = key
+                    elif key.startswith("x-"):
+                        section = "x-"
+                        head, _, body = entry.partition("\n")
+                        if "&" in head:
+                            anchors[head.partition("&")[2].strip()] = body
+                    elif key != "version":
+                        raise ValueError(f"{path}:{line}: unsupported top-level key '{key}'")
+                    elif entry.count("\n") > 1:
+                        raise ValueError(f"{path}:{line}: unexpected indented line")
+                elif section == "services":
+                    expanded = False
+                    if anchors and "*" in entry:
+                        try:
+                            plain = _expand_aliases(entry, anchors)
+                        except ValueError as e:
+                            raise ValueError(f"{path}:{line}: {e}") from None
+                        expanded, entry = plain != entry, plain
+                    for field in _FIELD_RE.findall(entry):
+                        if field not in known and not field.startswith("#"):
+                            offset = entry.index(f"\n    {field}")
+                            raise ValueError(f"{path}:{line + entry.count(chr(10), 0, offset) + 1}: unsupported service field '{field}'")
+                    blocks.append((key, entry, expanded))
+                elif section == "networks":
+                    fields = {}
+                    for sub in entry.splitlines()[1:]:
+                        k, _, v = sub.strip().partition(":")
+                        v = v.strip()
+                        # leaf values only (driver, subnet under ipam.config)
+                        if v and not k.startswith("#"):
+                            fields[k.lstrip("- ")] = _unquote(v)
+                    networks.append((key, fields))
+                elif section == "volumes":
+                    named.add(key)  # volume driver options are not modelled
+                elif section == "x-":
+                    pass  # extension data (compose ignores it too)
+                else:
+                    raise ValueError(f"{path}:{line}: unexpected indented line")
+                line += entry_lines
+            state["section"] = section
+            state["line"] = line
+
+        with open(path, encoding="utf-8") as f:
+            pending = ""
+            for chunk in iter(lambda: f.read(1 << 22), ""):
+                pending += chunk
+                # hand over everything up to the last entry start; keep the tail
+                cut = _last_entry_start(pending)
+                if cut:
+                    consume(pending[:cut])
+                    pending = pending[cut:]
+            consume(pending)
+
+        clashes = [b[0] for b in blocks if b[0] in self.services] + [n[0] for n in networks if n[0] in self.networks]
+        if clashes:
+            raise ValueError(f"already defined: {', '.join(clashes)}")
+        for name, fields in networks:
+            net = self.Network(name)
+            net.app = self
+            net.driver = ""  # only what the file says
+            net.apply_spec(fields)
+            self.add_network(net)
+        for name, fragment, expanded in blocks:
+            svc = self.Service.from_fragment(self.file, name, fragment, named)
+            svc.app = self
+            if expanded:
+                # merged scalars sit where the << key was: render again rather than verbatim
+                svc.invalidate()
+            self.services.add(svc, defer_refs=True)
+        if blocks:
+            # the imported ports/addresses are seeded (and conflicts reported) on next use
+            self._ports = None
+            self._allocators.clear()
+        return {
+            "services": len(blocks),
+            "networks": len(networks),
+            "volumes": len(named),
+            "bytes": path.stat().st_size,
+            "seconds": time.perf_counter() - t0,
+        }
+
+    # command table: (name, aliases, handler, what its arguments complete to);
+    # "edit service" is also accepted as edit_service / edit-service
+    COMMANDS = (
+        ("add service", ("as",), "_cmd_add_service", None),
+        ("show services", ("ss",), "_cmd_show_services", None),
+        ("edit service", ("es",), "_cmd_edit_service", "service"),
+        ("rename service", ("rs",), "_cmd_rename_service", "service"),
+        ("delete service", ("ds",), "_cmd_delete_service", "service"),
+        ("add network", ("an",), "_cmd_add_network", None),
+        ("show networks", ("sn",), "_cmd_show_networks", None),
+        ("edit network", ("en",), "_cmd_edit_network", "network"),
+        ("rename network", ("rn",), "_cmd_rename_network", "network"),
+        ("delete network", ("dn",), "_cmd_delete_network", "network"),
+        ("replicate", ("generate",), "_cmd_replicate", "service"),
+        ("graph", (), "_cmd_graph", "service"),
+        ("import", (), "_cmd_import", None),
+        ("export", (), "_cmd_export", "mode"),
+        ("clear", ("c",), "_cmd_clear", None),
+        ("stats", (), "_cmd_stats", None),
+        ("help", ("?",), "_cmd_help", None),
+        ("exit", (), "_cmd_exit", None),
+    )
+    _COMMAND_KEYS = _command_keys(COMMANDS)
+    # what the first word of a command line can be
+    _COMMAND_WORDS = sorted({entry[0].split()[0] for entry in COMMANDS}.union(_COMMAND_KEYS))
+
+    def find_command(self, tokens):
+        """Resolve a tokenized command line to (command entry, arguments), or None."""
+        keys = self._COMMAND_KEYS
+        head = tokens[0].replace("-", "_")
+        if len(tokens) > 1 and f"{head}_{tokens[1]}" in keys:
+            return keys[f"{head}_{tokens[1]}"], tokens[2:]
+        if head in keys:
+            return keys[head], tokens[1:]
+        return None
+
+    def complete(self, line, text, limit=200):
+        """Candidates for the word `text` being typed at the end of `line`."""
+        words = line.split()
+        if line[-1:] not in ("", " "):
+            words = words[:-1]  # the word being completed is `text`
+        if not words:
+            return [w for w in self._COMMAND_WORDS if w.startswith(text)]
+        found = self.find_command(words)
+        if found is None:
+            # second word of a two-word command: "edit s" -> service
+            head = words[0].replace("-", "_")
+            if len(words) == 1:
+                return [key.split("_", 1)[1] for key in self._COMMAND_KEYS if key.startswith(f"{head}_{text}")]
+            return []
+        kind = found[0][3]
+        if kind == "service":
+            return self.services.complete(text, limit)
+        if kind == "network":
+            return self.networks.complete(text, limit)
+        if kind == "mode":
+            return [mode for mode in ("dedup", "plain") if mode.startswith(text)]
+        return []
+
+    def _setup_readline(self):
+        # tab completion and history on a terminal only; readline is missing on some platforms
+        if not sys.stdin.isatty():
+            return
+        try:
+            import readline
+        except ImportError:
+            return
+        matches = []
+
+        def completer(text, state):
+            if state == 0:
+                line = readline.get_line_buffer()[:readline.get_endidx()]
+                matches[:] = self.complete(line, text)
+            return matches[state] if state < len(matches) else None
+
+        readline.set_completer(completer)
+        readline.set_completer_delims(" ")
+        if "libedit" in (readline.__doc__ or ""):
+            readline.parse_and_bind("bind ^I rl_complete")  # macOS
+        else:
+            readline.parse_and_bind("tab: complete")
+        self._readline = readline
+
+    def loop(self, time_startup=False):
+        self.p_accent(f"Welcome to {self.name} v{self.version}!")
+        self._setup_readline()
+        if time_startup:
+            # where the first prompt would show: colorama and readline are loaded by now
+            print(f"startup: {(time.perf_counter() - _STARTED) * 1000:.1f} ms")
+            return
+        while True:
+            command = self.p_input("Enter command (add service, show services, add network, show networks, edit service <name>, edit network <name>, clear, export, help, exit): ").strip()
+            if not command:
                 continue
+            found = self.find_command(command.split())
+            if found is None:
+                self.p_warn("Unknown command. Please try again.")
+                continue
+            entry, args = found
+            with self.stats.measure(entry[0]):
+                done = getattr(self, entry[2])(args)
+            if done:
+                break
 
-            # fallback to existing command parsing
-            # keep supporting original command names
-            if command == "add_service" or command == "add service" or command == "as":
-                service_name = self.p_input("Enter service name: ").strip()
-                if not service_name:
-                    self.p_warn("Service name required.")
-                    continue
-                svc = self.Service(self.file, service_name)
-                # inject app reference so Service can use colored I/O
-                svc.app = self
-                svc.configure_interactive(available_networks=[n.name for n in self.networks])
-                self.services.append(svc)
-                self.p_info(f"Service '{service_name}' added.")
-            elif command == "show_services" or command == "show services" or command == "ss":
-                if not self.services:
-                    self.p_warn("No services defined.")
-                for svc in self.services:
-                    print(self._color(svc.print_infos(), Fore.WHITE))
-            elif command == "add_network" or command == "add network" or command == "an":
-                net_name = self.p_input("Enter network name: ").strip()
-                if not net_name:
-                    self.p_warn("Network name required.")
-                    continue
-                net = self.Network(net_name)
-                net.app = self
-                net.configure_interactive()
-                self.networks.append(net)
-                self.p_info(f"Network '{net_name}' added.")
-            elif command == "show_networks" or command == "show networks" or command == "sn":
-                if not self.networks:
-                    self.p_warn("No networks defined.")
-                for net in self.networks:
-                    print(self._color(net.print_infos(), Fore.WHITE))
-            elif command == "export":
-                self.export_compose()
-            elif command == "exit":
-                self.p_info("Exiting MagicomPose.")
+    def _cmd_help(self, args):
+        for name, aliases, _, kind in self.COMMANDS:
+            usage = f"{name} <{kind}>" if kind else name
+            print(f"  {usage:<24} {' | '.join(aliases)}".rstrip())
+
+    def _cmd_stats(self, args):
+        # stats | stats json | stats reset
+        if args[:1] == ["reset"]:
+            self.stats.reset()
+            self.p_info("Stats cleared.")
+            return
+        if not self.stats.totals:
+            self.p_warn("Nothing measured yet.")
+            return
+        if args[:1] == ["json"]:
+            for name, total in self.stats.totals.items():
+                print(json.dumps({"name": name, **total}, separators=(",", ":")))
+            return
+        print(f"  {'command':<24} {'count':>6} {'total ms':>10} {'max ms':>10} {'prompt ms':>10}")
+        for name, total in sorted(self.stats.totals.items(), key=lambda item: -item[1]["seconds"]):
+            extra = " ".join(f"{key}={value}" for key, value in total.items()
+                             if key not in ("count", "seconds", "max_seconds", "input_seconds"))
+            print(f"  {name:<24} {total['count']:>6} {total['seconds'] * 1000:>10.1f} "
+                  f"{total['max_seconds'] * 1000:>10.1f} {total.get('input_seconds', 0) * 1000:>10.1f} {extra}".rstrip())
+
+    def _cmd_clear(self, args):
+        self.clear()
+
+    def _cmd_exit(self, args):
+        self.close_state()
+        self.p_info("Exiting MagicomPose.")
+        return True
+
+    def _cmd_export(self, args):
+        # export | export dedup | export plain (the mode sticks for later exports)
+        if args and args[0] not in ("dedup", "plain"):
+            self.p_warn("Usage: export [dedup | plain]")
+            return
+        self.export_compose(dedup=args[0] == "dedup" if args else None)
+
+    def _cmd_add_service(self, args):
+        service_name = self.p_input("Enter service name: ").strip()
+        if not service_name:
+            self.p_warn("Service name required.")
+            return
+        if service_name in self.services:
+            self.p_warn(f"Service '{service_name}' already exists. Use 'edit service {service_name}'.")
+            return
+        svc = self.Service(self.file, service_name)
+        # inject app reference so Service can use colored I/O
+        svc.app = self
+        svc.configure_interactive(available_networks=self.networks.names())
+        try:
+            self.add_service(svc)
+        except ValueError as e:
+            self.p_err(f"Service '{service_name}' not added: {e}")
+            return
+        for problem in self.unresolved_references(svc):
+            self.p_warn(problem)
+        self.p_info(f"Service '{service_name}' added.")
+
+    def _cmd_show_services(self, args):
+        if not self.services:
+            self.p_warn("No services defined.")
+        for svc in self.services:
+            print(self._color(svc.print_infos(), "plain"))
+
+    def _cmd_edit_service(self, args):
+        svc_name = args[0] if args else ""
+        if not svc_name:
+            self.p_warn("Service name required. Usage: edit service <name> | edit_service <name> | es <name>")
+            return
+        svc = self.get_service(svc_name)
+        if not svc:
+            self.p_warn(f"Service '{svc_name}' not found.")
+            return
+        # show current config and confirm
+        print(self._color(svc.print_infos(), "plain"))
+        ans = self.p_input("Edit this service? [y/N]: ").strip().lower()
+        if ans != "y":
+            self.p_info("Edit cancelled.")
+            return
+        # run interactive configure again (it will use current values as defaults)
+        before = _copy_details(svc.service_details)
+        svc.configure_interactive(available_networks=self.networks.names())
+        try:
+            self.update_service(svc, before)
+        except ValueError as e:
+            self.p_err(f"{e}; service '{svc_name}' left unchanged.")
+            return
+        for problem in self.unresolved_references(svc):
+            self.p_warn(problem)
+        self.p_info(f"Service '{svc_name}' updated.")
+
+    def _cmd_rename_service(self, args):
+        self._rename_or_delete("rename", "service", args)
+
+    def _cmd_delete_service(self, args):
+        self._rename_or_delete("delete", "service", args)
+
+    def _cmd_add_network(self, args):
+        net_name = self.p_input("Enter network name: ").strip()
+        if not net_name:
+            self.p_warn("Network name required.")
+            return
+        if net_name in self.networks:
+            self.p_warn(f"Network '{net_name}' already exists. Use 'edit network {net_name}'.")
+            return
+        net = self.Network(net_name)
+        net.app = self
+        net.configure_interactive()
+        self.add_network(net)
+        self.p_info(f"Network '{net_name}' added.")
+
+    def _cmd_show_networks(self, args):
+        if not self.networks:
+            self.p_warn("No networks defined.")
+        for net in self.networks:
+            print(self._color(net.print_infos(), "plain"))
+
+    def _cmd_edit_network(self, args):
+        net_name = args[0] if args else ""
+        if not net_name:
+            self.p_warn("Network name required. Usage: edit network <name> | edit_network <name> | en <name>")
+            return
+        net = self.get_network(net_name)
+        if not net:
+            self.p_warn(f"Network '{net_name}' not found.")
+            return
+        print(self._color(net.print_infos(), "plain"))
+        ans = self.p_input("Edit this network? [y/N]: ").strip().lower()
+        if ans != "y":
+            self.p_info("Edit cancelled.")
+            return
+        before = net.to_spec()
+        net.configure_interactive()
+        try:
+            self.update_network(net, before)
+        except ValueError as e:
+            self.p_err(f"{e}; network '{net_name}' left unchanged.")
+            return
+        self.p_info(f"Network '{net_name}' updated.")
+
+    def _cmd_rename_network(self, args):
+        self._rename_or_delete("rename", "network", args)
+
+    def _cmd_delete_network(self, args):
+        self._rename_or_delete("delete", "network", args)
+
+    def _rename_or_delete(self, action, kind, args):
+        needed = 2 if action == "rename" else 1
+        if len(args) != needed:
+            usage = "<old> <new>" if action == "rename" else "<name>"
+            self.p_warn(f"Usage: {action} {kind} {usage}")
+            return
+        registry = self.services if kind == "service" else self.networks
+        if args[0] not in registry:
+            self.p_warn(f"{kind.capitalize()} '{args[0]}' not found.")
+            return
+        try:
+            if action == "rename":
+                (self.rename_service if kind == "service" else self.rename_network)(*args)
+                self.p_info(f"{kind.capitalize()} '{args[0]}' renamed to '{args[1]}'.")
+            else:
+                (self.delete_service if kind == "service" else self.delete_network)(args[0])
+                self.p_info(f"{kind.capitalize()} '{args[0]}' deleted.")
+        except ValueError as e:
+            self.p_warn(str(e))
+
+    def _cmd_replicate(self, args):
+        if len(args) < 2 or not args[1].isdigit():
+            self.p_warn("Usage: replicate <template service> <count> [name pattern, default '{name}-{i}']")
+            return
+        pattern = args[2] if len(args) > 2 else "{name}-{i}"
+        env = {}
+        self.p_info("Per-replica env overrides as KEY=VALUE ({i} = replica number, {name} = replica name). Leave blank to finish.")
+        while True:
+            e = self.p_input("Env: ").strip()
+            if not e:
                 break
+            if "=" not in e:
+                self.p_warn("Invalid format. Use KEY=VALUE.")
+                continue
+            k, v = e.split("=", 1)
+            env[k.strip()] = v.strip()
+        static_ips = self.p_input("Static IP on every network with a subnet? [y/N]: ").strip().lower() == "y"
+        t0 = time.perf_counter()
+        try:
+            created = self.replicate(args[0], int(args[1]), pattern, env=env, static_ips=static_ips)
+        except (ValueError, KeyError, IndexError) as e:
+            self.p_err(f"Replication failed: {e}")
+            return
+        self.p_info(f"{len(created)} services created from '{args[0]}' in {(time.perf_counter() - t0) * 1000:.1f} ms.")
+
+    def _cmd_graph(self, args):
+        self.print_graph(args[0] if args else None)
+
+    def _cmd_import(self, args):
+        path = " ".join(args) or self.file
+        try:
+            stats = self.import_compose(path)
+        except (OSError, ValueError) as e:
+            self.p_err(f"Import failed: {e}")
+            return
+        # a whole file is easier to persist as a fresh snapshot than as journal lines
+        self.compact_state()
+        self.p_info(f"Imported {stats['services']} services, {stats['networks']} networks and "
+                    f"{stats['volumes']} volumes ({stats['bytes'] / 1024:.0f} KiB) in {stats['seconds'] * 1000:.1f} ms.")
+
+
+_ENTRY_RE = re.compile(r"\n(?=[^ \n]|  [^ \n])")  # newline before a top-level key or 2-space entry
+_BLOCK_RE = re.compile(r"^(?=    [^ \n])", re.MULTILINE)  # start of a service field in a fragment
+_ALIAS_RE = re.compile(r"^    ([^ \n:]+): \*([^ \n]+)\n", re.MULTILINE)  # field: *anchor in a service block
+DEDUP_SCALARS = ("image", "restart", "command", "shm_size", "cpuset")  # one-line fields merged with <<:
+_FIELD_RE = re.compile(r"\n    ([^ \n][^:\n]*)")  # service-level keys
+_VOLUMES_RE = re.compile(r"\n    volumes:\n((?:      .*\n)*)")
+
+
+def _field_blocks(fragment):
+    # "  name:\n" header, then one string per field with all its lines
+    header, _, body = fragment.partition("\n")
+    return header + "\n", [block for block in _BLOCK_RE.split(body) if block]
+
+
+def _block_field(block):
+    return block[4:block.index(":")]
+
+
+def _expand_aliases(entry, anchors):
+    # inline the x- anchors a deduplicated export refers to: back to a plain service block
+    def expand(match):
+        field, name = match.groups()
+        if name not in anchors:
+            raise ValueError(f"unknown anchor '*{name}'")
+        body = anchors[name]
+        if field == "<<":
+            return body
+        return f"    {field}:\n" + "".join("  " + line for line in body.splitlines(True))
+    return _ALIAS_RE.sub(expand, entry)
+
+
+def _last_entry_start(text):
+    pos = len(text)
+    while True:
+        pos = text.rfind("\n", 0, pos)
+        if pos < 0:
+            return 0
+        nxt = text[pos + 1:pos + 4]
+        if len(nxt) == 3 and (nxt[0] not in " \n" or (nxt[:2] == "  " and nxt[2] not in " \n")):
+            return pos + 1
+
+
+def _volume_sources(fragment):
+    match = _VOLUMES_RE.search(fragment)
+    if not match:
+        return []
+    return [_unquote(item.strip()[2:].strip()).partition(":")[0] for item in match.group(1).splitlines()]
+
+
+def _json_scalar(value):
+    # values written by _yaml_value; older exports did not escape quoted strings
+    try:
+        return json.loads(value)
+    except ValueError:
+        return _unquote(value)
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def parse_service_fragment(fragment, named_volumes=()):
+    """Parse one exported service block back into a service_details mapping.
+
+    Only the fields present in the block are returned; volume sources listed
+    in `named_volumes` (the top-level volumes section) become named volumes,
+    every other source is a bind mount.
+    """
+    details = {}
+    lines = fragment.splitlines()
+    field = container = None
+    parents = []  # parents[i]: mapping holding the keys indented 6 + 2 * i
+    for line in lines[1:]:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        indent = len(line) - len(line.lstrip(" "))
+        if indent == 4:
+            field, _, value = stripped.partition(":")
+            value = value.strip()
+            container = None
+            if value:
+                details[field] = _unquote(value)
+        elif stripped.startswith("- ") and indent == 6:
+            if container is None:
+                container = details[field] = []
+            container.append(_unquote(stripped[2:].strip()))
+        else:
+            # mappings, nested for networks.<name>.ipv4_address, deploy.resources.limits.cpus, ...
+            if container is None:
+                container = details[field] = {}
+                parents = [container]
+            depth = (indent - 6) // 2
+            del parents[depth + 1:]
+            key, _, value = stripped.partition(":")
+            value = value.strip()
+            if field == "healthcheck" and key == "test" and value[:1] in "[\"":
+                node = _json_scalar(value)
             else:
-                self.p_warn("Unknown command. Please try again.")
+                node = {} if value in ("", "{}") else _unquote(value)
+            parents[depth][key] = node
+            if isinstance(node, dict):
+                parents.append(node)
+    if "volumes" in details:
+        volumes = []
+        for vol in details["volumes"]:
+            src, _, tgt = vol.partition(":")
+            volumes.append({"type": "named" if src in named_volumes else "bind", "source": src, "target": tgt})
+        details["volumes"] = volumes
+    nets = details.get("networks")
+    if isinstance(nets, list):
+        details["networks"] = {name: "" for name in nets}
+    elif isinstance(nets, dict):
+        details["networks"] = {name: cfg.get("ipv4_address", "") if isinstance(cfg, dict) else "" for name, cfg in nets.items()}
+    # the generated build section stands for image auto
+    if details.pop("build", None) is not None and not details.get("image"):
+        details["image"] = "auto"
+    # back to the flat TUNING_FIELDS layout
+    deps = details.get("depends_on")
+    if isinstance(deps, dict):
+        details["depends_on"] = list(deps)
+        details["depends_on_conditions"] = {name: cfg["condition"] for name, cfg in deps.items()
+                                            if isinstance(cfg, dict) and cfg.get("condition")}
+    deploy = details.pop("deploy", None)
+    if isinstance(deploy, dict) and isinstance(deploy.get("resources"), dict):
+        details["resources"] = {f"{section}.{kind}": value
+                                for section, limits in deploy["resources"].items() if isinstance(limits, dict)
+                                for kind, value in limits.items()}
+    if isinstance(details.get("ulimits"), dict):
+        details["ulimits"] = {name: f"{v.get('soft')}:{v.get('hard')}" if isinstance(v, dict) else v
+                              for name, v in details["ulimits"].items()}
+    return details
+
+
+class _HashSink:
+    # text "stream" that only hashes what is written (same bytes as the utf-8 file)
+    def __init__(self):
+        import hashlib
+        self._hash = hashlib.sha256()
+
+    def write(self, text):
+        self._hash.update(text.encode("utf-8"))
+
+    def digest(self):
+        return self._hash.digest()
+
+
+def _stat_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def _file_digest(path):
+    import hashlib
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+# image: auto -> Dockerfile + .dockerignore generated in the compose file directory
+# project type -> files marking it, most specific first
+PROJECT_MARKERS = (
+    ("go", ("go.mod",)),
+    ("node", ("package.json",)),
+    ("python", ("requirements.txt", "pyproject.toml", "setup.py")),
+)
+BASE_IMAGES = {"python": "python:3.12-slim", "node": "node:20-alpine", "go": "golang:1.22"}
+GO_RUNTIME_IMAGE = "gcr.io/distroless/static-debian12"
+GENERATED_MARK = "# generated by magicompose"  # files without it belong to the user and are left alone
+IGNORED = {
+    "python": ("**/__pycache__", "**/*.py[cod]", ".venv", "venv", "*.egg-info", "build", "dist",
+               ".pytest_cache", ".mypy_cache", ".tox"),
+    "node": ("node_modules", "npm-debug.log*", "yarn-error.log*", "coverage", ".next", "dist"),
+    "go": ("bin", "*.test", "*.out"),
+}
+
+
+def detect_project(directory):
+    """(kind, file names in directory) for the first PROJECT_MARKERS match, (None, names) otherwise."""
+    try:
+        names = set(os.listdir(directory))
+    except FileNotFoundError:
+        names = set()
+    for kind, markers in PROJECT_MARKERS:
+        if names.intersection(markers):
+            return kind, names
+    return None, names
+
+
+def _generated(text):
+    # the mark sits on the first line, or the second after a "# syntax=" directive
+    return GENERATED_MARK in "".join(text.splitlines(True)[:2])
+
+
+def python_manifest(directory, names):
+    """The file a python project's dependencies can be read from without its sources (None if none)."""
+    if "requirements.txt" in names:
+        return "requirements.txt"
+    if "pyproject.toml" in names:
+        try:
+            import tomllib  # python >= 3.11
+            with open(Path(directory) / "pyproject.toml", "rb") as f:
+                project = tomllib.load(f).get("project", {})
+        except (ImportError, OSError, ValueError):
+            project = {}
+        if project and "dependencies" not in project.get("dynamic", ()):
+            return "pyproject.toml"
+    if "setup.py" in names:
+        return "setup.py"
+    return None
+
+
+def render_dockerfile(kind, names, directory="."):
+    # layers ordered for the build cache: dependency manifests first, sources last;
+    # BuildKit cache mounts keep the package caches across builds, runtime stage holds no toolchain
+    base = BASE_IMAGES[kind]
+    lines = ["# syntax=docker/dockerfile:1", f"{GENERATED_MARK} ({kind} project): remove this line to keep your changes"]
+    if kind == "python":
+        lines += [f"FROM {base} AS deps", "RUN python -m venv /opt/venv", "ENV PATH=/opt/venv/bin:$PATH", "WORKDIR /src"]
+        pip = "RUN --mount=type=cache,target=/root/.cache/pip"
+        manifest = python_manifest(directory, names)
+        if manifest == "requirements.txt":
+            lines += ["COPY requirements.txt ./", f"{pip} pip install -r requirements.txt"]
+        elif manifest == "pyproject.toml":
+            # static [project] dependencies in their own layer, then the package alone
+            lines += ["COPY pyproject.toml ./",
+                      f"{pip} python -c \"import tomllib; print('\\n'.join(tomllib.load(open('pyproject.toml', 'rb'))"
+                      "['project'].get('dependencies', [])))\" > /tmp/requirements.txt \\",
+                      "    && pip install -r /tmp/requirements.txt",
+                      "COPY . .", f"{pip} pip install --no-deps ."]
+        elif manifest == "setup.py":
+            # install_requires from the egg-info metadata (setup.py has to run without the sources)
+            copied = "setup.py setup.cfg" if "setup.cfg" in names else "setup.py"
+            lines += [f"COPY {copied} ./",
+                      f"{pip} pip install setuptools && python setup.py -q egg_info --egg-base /tmp \\",
+                      "    && cat /tmp/*.egg-info/requires.txt 2>/dev/null | sed '/^\\[/,$d' > /tmp/requirements.txt \\",
+                      "    && pip install -r /tmp/requirements.txt",
+                      "COPY . .", f"{pip} pip install --no-deps ."]
+        else:
+            # dependencies only known to the build backend: pip needs the sources,
+            # the pip cache still skips downloads and wheel builds
+            lines += ["COPY . .", f"{pip} pip install ."]
+        lines += ["", f"FROM {base}", "ENV PATH=/opt/venv/bin:$PATH PYTHONDONTWRITEBYTECODE=1 PYTHONUNBUFFERED=1",
+                  "WORKDIR /app", "COPY --from=deps /opt/venv /opt/venv", "COPY . ."]
+        entry = next((name for name in ("main.py", "app.py") if name in names), None)
+        lines.append(f'CMD ["python", "{entry}"]' if entry else "# no main.py/app.py: set the service command")
+    elif kind == "node":
+        if "yarn.lock" in names:
+            manifests, install = "package.json yarn.lock", \
+                "--mount=type=cache,target=/usr/local/share/.cache/yarn yarn install --frozen-lockfile --production"
+        elif "package-lock.json" in names:
+            manifests, install = "package.json package-lock.json", "--mount=type=cache,target=/root/.npm npm ci --omit=dev"
+        else:
+            manifests, install = "package.json", "--mount=type=cache,target=/root/.npm npm install --omit=dev"
+        lines += [f"FROM {base} AS deps", "WORKDIR /app", f"COPY {manifests} ./", f"RUN {install}",
+                  "", f"FROM {base}", "ENV NODE_ENV=production", "WORKDIR /app",
+                  "COPY --from=deps /app/node_modules ./node_modules", "COPY . .", 'CMD ["npm", "start"]']
+    elif kind == "go":
+        manifests = "go.mod go.sum" if "go.sum" in names else "go.mod"
+        lines += [f"FROM {base} AS build", "WORKDIR /src", f"COPY {manifests} ./",
+                  "RUN --mount=type=cache,target=/go/pkg/mod go mod download", "COPY . .",
+                  "RUN --mount=type=cache,target=/go/pkg/mod --mount=type=cache,target=/root/.cache/go-build \\",
+                  '    CGO_ENABLED=0 go build -trimpath -ldflags="-s -w" -o /out/app .',
+                  "", f"FROM {GO_RUNTIME_IMAGE}", "COPY --from=build /out/app /app", 'ENTRYPOINT ["/app"]']
+    else:
+        raise ValueError(f"unknown project type '{kind}'")
+    return "\n".join(lines) + "\n"
+
+
+def render_dockerignore(kind, compose_name):
+    # a small build context: sent faster and 'COPY . .' is not invalidated by unrelated files
+    lines = [f"{GENERATED_MARK} ({kind} project): remove this line to keep your changes",
+             ".git", ".magicompose", compose_name, "Dockerfile", ".dockerignore"]
+    lines += IGNORED[kind]
+    return "\n".join(lines) + "\n"
+
+
+SPEC_SUFFIXES = (".json", ".toml", ".yml", ".yaml")
+BATCH_OUTPUT_SUFFIX = ".docker-compose.yml"  # run_batch writes <spec stem> + this
+
+
+def parse_spec(text, fmt="json"):
+    """Parse spec text; fmt is one of json, toml, yaml."""
+    if fmt == "json":
+        return json.loads(text)
+    if fmt == "toml":
+        import tomllib  # python >= 3.11
+        return tomllib.loads(text)
+    if fmt == "yaml":
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML specs need PyYAML (pip install pyyaml)") from None
+        return yaml.safe_load(text) or {}
+    raise ValueError(f"unknown spec format '{fmt}'")
+
+
+def load_spec_file(path):
+    # '-' reads the spec from stdin (JSON, falling back to YAML)
+    if str(path) == "-":
+        text = sys.stdin.read()
+        try:
+            return parse_spec(text, "json")
+        except json.JSONDecodeError:
+            return parse_spec(text, "yaml")
+    path = Path(path)
+    fmt = {".json": "json", ".toml": "toml", ".yml": "yaml", ".yaml": "yaml"}.get(path.suffix.lower())
+    if fmt is None:
+        raise ValueError(f"unsupported spec file '{path}' (expected {', '.join(SPEC_SUFFIXES)})")
+    return parse_spec(path.read_text(encoding="utf-8"), fmt)
+
+
+def render_spec(spec_path, output, dedup=False):
+    """Build a compose file from one spec; returns (spec, output, n_services, seconds, error)."""
+    t0 = time.perf_counter()
+    try:
+        spec = load_spec_file(spec_path)
+        if not isinstance(spec, dict):
+            raise ValueError("spec must be a mapping with 'services' / 'networks'")
+        if spec.get("output") and str(spec_path) != "-":
+            # output in the spec is relative to the spec file
+            output = Path(spec_path).parent / spec.pop("output")
+        spec.pop("output", None)
+        app = App(path=output, quiet=True)
+        app.dedup = dedup
+        app.load_spec(spec)
+        if not app.export_compose():
+            raise OSError(f"could not write {output}")
+        error = None
+        n_services = len(app.services)
+    except Exception as e:
+        error = str(e)
+        n_services = 0
+    return str(spec_path), str(output), n_services, time.perf_counter() - t0, error
+
+
+def run_batch(spec_dir, output_dir=None, jobs=None, dedup=False):
+    """Render every spec file in spec_dir across a process pool; returns the number of failures."""
+    spec_dir = Path(spec_dir)
+    output_dir = Path(output_dir) if output_dir else spec_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # outputs land next to the specs by default: a later run must not take them for specs
+    specs = sorted(p for p in spec_dir.iterdir() if p.is_file() and p.suffix.lower() in SPEC_SUFFIXES
+                   and not p.name.endswith(BATCH_OUTPUT_SUFFIX))
+    if not specs:
+        print(f"No spec files found in {spec_dir}", file=sys.stderr)
+        return 1
+    t0 = time.perf_counter()
+    failures = 0
+    total_services = 0
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(render_spec, str(p), str(output_dir / f"{p.stem}{BATCH_OUTPUT_SUFFIX}"), dedup) for p in specs]
+        for fut in as_completed(futures):
+            spec, output, n_services, seconds, error = fut.result()
+            if error:
+                failures += 1
+                print(f"FAIL {spec}: {error}", file=sys.stderr)
+            else:
+                total_services += n_services
+                print(f"ok   {spec} -> {output} ({n_services} services, {seconds * 1000:.1f} ms)")
+    elapsed = time.perf_counter() - t0
+    done = len(specs) - failures
+    print(f"{done}/{len(specs)} projects, {total_services} services in {elapsed:.2f}s "
+          f"({done / elapsed:.1f} projects/s, {total_services / elapsed:.0f} services/s)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Magical docker compose creation, cli-like.")
+    parser.add_argument("--spec", help="spec file (json/toml/yaml), '-' for stdin, or a directory of specs (batch mode)")
+    parser.add_argument("-o", "--output", help="output file (single spec) or directory (spec directory)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes for a spec directory")
+    parser.add_argument("--dedup", action="store_true", help="write repeated service blocks once, as x- anchors")
+    parser.add_argument("--no-state", action="store_true", help="do not restore/save the project state (.magicompose/)")
+    parser.add_argument("--stats-file", help="append a JSON line per command / export step to this file (interactive mode)")
+    parser.add_argument("--trace-memory", action="store_true", help="record the tracemalloc peak of each command (slower)")
+    parser.add_argument("--time-startup", action="store_true",
+                        help="print the time from import to the first prompt and exit (interactive mode)")
+    args = parser.parse_args(argv)
+
+    if args.spec is None:
+        current_path = str(Path.cwd()) + "/docker-compose.yml"
+        app = App(path=current_path)
+        app.dedup = args.dedup
+        if args.stats_file or args.trace_memory:
+            app.stats = CommandStats(args.stats_file, trace_memory=args.trace_memory)
+        if not args.no_state:
+            try:
+                stats = app.open_state()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                app.p_err(f"Cannot restore the project state: {e}")
+                app.p_err("Fix or remove .magicompose/, or start with --no-state.")
+                return 1
+            app.stats.record("open_state", stats["seconds"])
+            if stats["services"] or stats["networks"]:
+                app.p_info(f"Restored {stats['services']} services and {stats['networks']} networks "
+                           f"in {stats['seconds'] * 1000:.1f} ms.")
+        try:
+            app.loop(time_startup=args.time_startup)
+        finally:
+            app.close_state()
+            app.stats.close()
+        return 0
+    if args.spec != "-" and Path(args.spec).is_dir():
+        return 1 if run_batch(args.spec, args.output, args.jobs, args.dedup) else 0
+    output = args.output or str(Path.cwd() / "docker-compose.yml")
+    spec, output, n_services, seconds, error = render_spec(args.spec, output, args.dedup)
+    if error:
+        print(f"FAIL {spec}: {error}", file=sys.stderr)
+        return 1
+    print(f"ok   {spec} -> {output} ({n_services} services, {seconds * 1000:.1f} ms)")
+    return 0
+
 
 if __name__ == "__main__":
-    current_path = str(Path.cwd()) + "/docker-compose.yml"
-    app = App(path=current_path)
-    app.loop()
+    sys.exit(main())
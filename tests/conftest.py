@@ -0,0 +1,55 @@
+import io
+
+import pytest
+
+from magicompose import App
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    # App writing into the test's temp dir; spec loaded without prompting
+    def make(spec=None, name="docker-compose.yml"):
+        app = App(path=str(tmp_path / name), quiet=True)
+        if spec:
+            app.load_spec(spec)
+        return app
+    return make
+
+
+@pytest.fixture
+def spec():
+    # one of every exported field kind
+    return {
+        "networks": {"back": {"subnet": "10.0.0.0/24"}, "front": {}},
+        "services": {
+            "db": {
+                "image": "postgres:16", "environment": {"POSTGRES_PASSWORD": "secret"},
+                "volumes": ["pgdata:/var/lib/postgresql/data"], "networks": {"back": "10.0.0.5"},
+                "restart": "always", "shm_size": "256m",
+                "healthcheck": {"test": "[ -f /tmp/ready ] || exit 1", "interval": "10s", "retries": 5},
+            },
+            "web": {
+                "image": "nginx:latest", "ports": ["8080:80", "127.0.0.1:9000-9001:9000-9001/udp"],
+                "expose": ["3000"], "volumes": ["./html:/usr/share/nginx/html"],
+                "depends_on": {"db": {"condition": "service_healthy"}}, "command": "nginx -g 'daemon off;'",
+                "networks": {"back": "", "front": ""}, "restart": "unless-stopped",
+                "resources": {"limits": {"cpus": "0.5", "memory": "512m"}},
+                "ulimits": {"nofile": {"soft": 1024, "hard": 2048}},
+                "healthcheck": {"test": ["CMD", "curl", "-f", "http://localhost/"]},
+            },
+            "worker": {"depends_on": ["db"], "environment": {"QUEUE": "jobs"}, "networks": {"back": "auto"}},
+        },
+    }
+
+
+@pytest.fixture
+def render():
+    # the compose document as export_compose writes it; fresh=True renders every service again
+    def render(app, fresh=False):
+        if fresh:
+            for svc in app.services:
+                svc.invalidate()
+        out = io.StringIO()
+        app.write_compose(out)
+        return out.getvalue()
+    return render
@@ -0,0 +1,28 @@
+import json
+
+from magicompose import render_spec, run_batch
+
+
+def test_render_spec(tmp_path):
+    spec = tmp_path / "project.json"
+    spec.write_text(json.dumps({"services": {"web": {"image": "nginx", "ports": ["80:80"]}}}))
+    _, output, n_services, _, error = render_spec(str(spec), str(tmp_path / "out.yml"))
+    assert error is None and n_services == 1
+    assert "image: nginx" in (tmp_path / "out.yml").read_text()
+
+
+def test_render_spec_reports_errors(tmp_path):
+    spec = tmp_path / "bad.json"
+    spec.write_text(json.dumps({"services": {"web": {"image": "x", "depends_on": ["db"]}}}))
+    error = render_spec(str(spec), str(tmp_path / "out.yml"))[4]
+    assert "db" in error
+
+
+def test_batch_reruns_ignore_their_outputs(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / f"{name}.json").write_text(json.dumps({"services": {name: {"image": "nginx"}}}))
+    assert run_batch(tmp_path, jobs=1) == 0
+    first = sorted(p.name for p in tmp_path.iterdir())
+    assert first == ["a.docker-compose.yml", "a.json", "b.docker-compose.yml", "b.json"]
+    assert run_batch(tmp_path, jobs=1) == 0
+    assert sorted(p.name for p in tmp_path.iterdir()) == first
@@ -0,0 +1,32 @@
+from magicompose import detect_project, render_dockerfile
+
+
+def test_auto_image_builds(make_app, tmp_path):
+    (tmp_path / "requirements.txt").write_text("flask\n")
+    app = make_app({"services": {"api": {}, "db": {"image": "postgres"}}})
+    app.export_compose()
+    assert "    build:\n      context: .\n" in app.file.read_text()
+    dockerfile = (tmp_path / "Dockerfile").read_text()
+    assert dockerfile.index("COPY requirements.txt") < dockerfile.index("COPY . .")
+    assert (tmp_path / ".dockerignore").exists()
+
+    imported = make_app()
+    imported.import_compose()
+    assert [svc.needs_build() for svc in imported.services] == [True, False]
+    assert imported.get_service("api").service_details["image"] == "auto"
+
+
+def test_user_dockerfile_left_alone(make_app, tmp_path):
+    (tmp_path / "requirements.txt").write_text("flask\n")
+    (tmp_path / "Dockerfile").write_text("FROM python\nCOPY dist/ /app\n")
+    app = make_app({"services": {"api": {}}})
+    assert app.write_build_files() == []
+    assert (tmp_path / "Dockerfile").read_text() == "FROM python\nCOPY dist/ /app\n"
+    assert not (tmp_path / ".dockerignore").exists()
+
+
+def test_pyproject_dependencies_cached_apart(tmp_path):
+    (tmp_path / "pyproject.toml").write_text('[project]\nname = "x"\nversion = "1"\ndependencies = ["click"]\n')
+    kind, names = detect_project(tmp_path)
+    dockerfile = render_dockerfile(kind, names, tmp_path)
+    assert dockerfile.index("COPY pyproject.toml") < dockerfile.index("COPY . .") < dockerfile.index("--no-deps")
@@ -0,0 +1,13 @@
+from magicompose import App, main
+
+
+def test_time_startup_measures_up_to_the_first_prompt(tmp_path, monkeypatch, capsys):
+    events = []
+    monkeypatch.setattr(App, "_setup_readline", lambda self: events.append("readline"))
+    monkeypatch.setattr(App, "p_input", lambda self, text: events.append("prompt"))
+    monkeypatch.chdir(tmp_path)
+    assert main(["--time-startup", "--no-state"]) == 0
+    out = capsys.readouterr().out.splitlines()
+    # welcome banner (colors) and readline come first; no prompt is shown
+    assert out[0].startswith("Welcome") and out[-1].startswith("startup: ")
+    assert events == ["readline"]
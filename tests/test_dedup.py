@@ -0,0 +1,28 @@
+import pytest
+
+
+def test_dedup_export_round_trip(make_app, render):
+    app = make_app({"services": {
+        f"w{i}": {"image": "nginx", "command": "run", "restart": "always",
+                  "environment": {"MODE": "prod", "LEVEL": "info"}, "ports": [f"{8000 + i}:80"]}
+        for i in range(4)
+    }})
+    plain = render(app)
+    app.dedup = True
+    dedup = render(app)
+    assert len(dedup) < len(plain)
+    assert "<<: *common-1" in dedup and "environment: *environment-1" in dedup
+    yaml = pytest.importorskip("yaml")
+    assert yaml.safe_load(dedup)["services"] == yaml.safe_load(plain)["services"]
+
+    app.file.write_text(dedup)
+    imported = make_app()
+    imported.import_compose()
+    # merged scalars come back in their plain export position
+    assert render(imported) == plain
+
+
+def test_small_blocks_stay_inline(make_app, render):
+    app = make_app({"services": {"a": {"image": "x"}, "b": {"image": "y"}}})
+    app.dedup = True
+    assert "x-" not in render(app)
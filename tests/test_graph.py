@@ -0,0 +1,16 @@
+import pytest
+
+from magicompose import DependencyGraph
+
+
+def test_dependency_graph(make_app, spec):
+    app = make_app(spec)
+    graph = DependencyGraph(app.services)
+    assert graph.waves() == [["db"], ["web", "worker"]]
+    assert graph.dependents("db") == ["web", "worker"]
+    assert graph.dependencies("web") == ["db"]
+    app.get_service("db").service_details["depends_on"] = ["worker"]
+    graph = DependencyGraph(app.services)
+    assert graph.find_cycle() in (["db", "worker", "db"], ["worker", "db", "worker"])
+    with pytest.raises(ValueError, match="dependency cycle"):
+        graph.waves()
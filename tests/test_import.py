@@ -0,0 +1,69 @@
+import pytest
+
+from magicompose import _last_entry_start, parse_service_fragment
+
+
+def test_import_round_trip(make_app, spec, render):
+    app = make_app(spec)
+    assert app.export_compose()
+    imported = make_app()
+    stats = imported.import_compose()
+    assert (stats["services"], stats["networks"], stats["volumes"]) == (3, 2, 1)
+    # untouched services are written back verbatim, re-rendered ones identically
+    assert render(imported) == app.file.read_text()
+    assert render(imported, fresh=True) == app.file.read_text()
+    for svc in app.services:
+        assert imported.get_service(svc.name).service_details == svc.service_details
+
+
+def test_parse_service_fragment():
+    fragment = (
+        "  app:\n"
+        "    image: app:1\n"
+        "    volumes:\n"
+        "      - \"data:/data\"\n"
+        "      - \"./conf:/etc/conf\"\n"
+        "    depends_on:\n"
+        "      db:\n"
+        "        condition: service_healthy\n"
+        "      cache:\n"
+        "        condition: service_started\n"
+        "    networks:\n"
+        "      back:\n"
+        "        ipv4_address: \"10.0.0.7\"\n"
+        "      front: {}\n"
+        "    deploy:\n"
+        "      resources:\n"
+        "        limits:\n"
+        "          memory: \"1g\"\n"
+        "    ulimits:\n"
+        "      nproc: 512\n"
+        "      nofile:\n"
+        "        soft: 1024\n"
+        "        hard: 4096\n"
+    )
+    details = parse_service_fragment(fragment, {"data"})
+    assert details["image"] == "app:1"
+    assert details["volumes"] == [
+        {"type": "named", "source": "data", "target": "/data"},
+        {"type": "bind", "source": "./conf", "target": "/etc/conf"},
+    ]
+    assert details["depends_on"] == ["db", "cache"]
+    assert details["depends_on_conditions"] == {"db": "service_healthy", "cache": "service_started"}
+    assert details["networks"] == {"back": "10.0.0.7", "front": ""}
+    assert details["resources"] == {"limits.memory": "1g"}
+    assert details["ulimits"] == {"nproc": "512", "nofile": "1024:4096"}
+
+
+def test_import_rejects_unknown_field(make_app, tmp_path):
+    path = tmp_path / "docker-compose.yml"
+    path.write_text("version: '3.8'\nservices:\n  web:\n    image: nginx\n    privileged: true\n")
+    with pytest.raises(ValueError, match=r":5: unsupported service field 'privileged'"):
+        make_app().import_compose()
+
+
+def test_last_entry_start():
+    text = "services:\n  a:\n    image: x\n  b:\n    image: y\n"
+    # the chunker keeps everything from the last entry on for the next chunk
+    assert text[_last_entry_start(text):] == "  b:\n    image: y\n"
+    assert _last_entry_start("    image: x\n") == 0
@@ -0,0 +1,65 @@
+import pytest
+
+from magicompose import IPv4Allocator
+
+
+def test_ipv4_allocator():
+    alloc = IPv4Allocator("10.0.0.0/29")
+    # network, gateway (first host) and broadcast are reserved
+    assert [alloc.allocate(f"s{i}") for i in range(5)] == [f"10.0.0.{i}" for i in range(2, 7)]
+    with pytest.raises(ValueError, match="no free address"):
+        alloc.allocate("full")
+    alloc.release("10.0.0.4")
+    assert alloc.allocate("again") == "10.0.0.4"
+    with pytest.raises(ValueError, match="already used by 's0'"):
+        alloc.reserve("10.0.0.2", "other")
+    with pytest.raises(ValueError, match="reserved"):
+        alloc.check("10.0.0.1", "other")
+    with pytest.raises(ValueError, match="outside subnet"):
+        alloc.check("10.0.1.2", "other")
+    alloc.reserve("10.0.0.2", "s0")  # its own address
+
+
+def test_ip_range_and_gateway():
+    alloc = IPv4Allocator("10.0.0.0/24", gateway="10.0.0.254", ip_range="10.0.0.128/30")
+    assert [alloc.allocate("s") for _ in range(4)] == ["10.0.0.128", "10.0.0.129", "10.0.0.130", "10.0.0.131"]
+    with pytest.raises(ValueError):
+        alloc.allocate("s")
+    alloc.reserve("10.0.0.1", "s")  # outside ip_range but inside the subnet: allowed as a static address
+
+
+def test_add_service_address_conflict(make_app, spec):
+    app = make_app(spec)
+    assert app.get_service("worker").service_details["networks"]["back"] == "10.0.0.2"  # auto
+    dup = app.Service(app.file, "dup")
+    dup.service_details["networks"]["back"] = "10.0.0.5"
+    with pytest.raises(ValueError, match="10.0.0.5 is already used by 'db'"):
+        app.add_service(dup)
+    assert "dup" not in app.services
+
+
+@pytest.mark.parametrize("fields, problem", [
+    ({"subnet": "10.9.0.0/24"}, "outside subnet"),
+    ({"gateway": "10.0.0.5"}, "reserved"),
+    ({"subnet": ""}, "needs a subnet"),
+    ({"subnet": "10.0.0.0/33"}, "invalid subnet"),
+])
+def test_network_edit_stranding_addresses_is_rejected(make_app, spec, fields, problem):
+    app = make_app(spec)
+    net = app.get_network("back")
+    before = net.to_spec()
+    for key, value in fields.items():
+        setattr(net, key, value)
+    with pytest.raises(ValueError, match=problem):
+        app.update_network(net, before)
+    assert net.to_spec() == before
+    assert "already used by 'db'" in app.check_ipv4("x", "back", "10.0.0.5")
+
+
+def test_network_edit(make_app, spec):
+    app = make_app(spec)
+    net = app.get_network("back")
+    before = net.to_spec()
+    net.subnet = "10.0.0.0/16"
+    app.update_network(net, before)
+    assert app.allocator("back").allocate("x") == "10.0.0.3"
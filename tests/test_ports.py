@@ -0,0 +1,102 @@
+import pytest
+
+from magicompose import PortIndex, _copy_details, parse_port_binding
+
+
+@pytest.mark.parametrize("spec, binding", [
+    ("80", None),
+    ("127.0.0.1::80", None),
+    ("8080:80", ("", 8080, 8080, "tcp")),
+    ("0.0.0.0:8080:80", ("", 8080, 8080, "tcp")),
+    ("127.0.0.1:8080:80/udp", ("127.0.0.1", 8080, 8080, "udp")),
+    ("[::1]:8080:80", ("::1", 8080, 8080, "tcp")),
+    ("8000-8010:8000-8010", ("", 8000, 8010, "tcp")),
+    ("8000-8010:80", ("", 8000, 8010, "tcp")),
+])
+def test_parse_port_binding(spec, binding):
+    assert parse_port_binding(spec) == binding
+
+
+@pytest.mark.parametrize("spec", ["x:80", "8080:80/icmp", "70000:80", "8000-8010:80-81", "10-5:80"])
+def test_parse_port_binding_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_port_binding(spec)
+
+
+def test_port_index():
+    index = PortIndex()
+    index.add(("", 8000, 8010, "tcp"), "a")
+    index.add(("127.0.0.1", 9000, 9000, "tcp"), "b")
+    index.add(("", 8005, 8005, "udp"), "c")  # other protocol
+    assert index.conflict(("", 8010, 8020, "tcp")) == ("a", 8000, 8010)
+    assert index.conflict(("10.0.0.1", 8003, 8003, "tcp")) == ("a", 8000, 8010)  # all interfaces
+    assert index.conflict(("", 9000, 9000, "tcp")) == ("b", 9000, 9000)
+    assert index.conflict(("10.0.0.1", 9000, 9000, "tcp")) is None
+    assert index.conflict(("", 8000, 8000, "tcp"), owner="a") is None
+    with pytest.raises(ValueError, match="taken by 'a'"):
+        index.add(("", 7990, 8000, "tcp"), "d")
+    assert index.next_free(8000, 2) == 8011
+    index.remove(("", 8000, 8010, "tcp"), "a")
+    assert index.conflict(("", 8003, 8003, "tcp")) is None
+
+
+def test_add_service_port_conflict(make_app, spec):
+    app = make_app(spec)
+    dup = app.Service(app.file, "dup")
+    dup.service_details["ports"] = ["8080:80"]
+    with pytest.raises(ValueError, match="8080/tcp is taken by 'web'"):
+        app.add_service(dup)
+    assert "dup" not in app.services
+
+
+def test_imported_ports_and_addresses_are_taken(make_app, spec):
+    make_app(spec).export_compose()
+    app = make_app({"services": {"other": {"image": "x", "ports": ["7000:70"]}}}, name="other.yml")
+    app.port_index()  # built before the import
+    app.import_compose(app.file.parent / "docker-compose.yml")
+    assert "taken by 'web'" in app.check_port("new", "8080:80")
+    assert "already used by 'db'" in app.check_ipv4("new", "back", "10.0.0.5")
+    assert "taken by 'other'" in app.check_port("new", "7000:70")
+
+
+def test_rejected_edit_is_rolled_back(make_app, spec):
+    app = make_app(spec)
+    web = app.get_service("web")
+    before = _copy_details(web.service_details)
+    web.service_details["ports"] = ["8080:80", "127.0.0.1:9000-9001:9000-9001/udp", "9999:99"]
+    web.service_details["networks"]["back"] = "10.0.0.5"  # db's address
+    with pytest.raises(ValueError, match="already used by 'db'"):
+        app.update_service(web, before)
+    assert web.service_details == before
+    # the old bindings are still held, the rejected ones are not
+    assert "taken by 'web'" in app.check_port("x", "8080:80")
+    assert app.check_port("x", "9999:99") is None
+
+
+def test_edit_moves_ports_and_addresses(make_app, spec):
+    app = make_app(spec)
+    db = app.get_service("db")
+    before = _copy_details(db.service_details)
+    db.service_details["ports"] = ["5432:5432"]
+    db.service_details["networks"]["back"] = "10.0.0.9"
+    app.update_service(db, before)
+    assert app.check_ipv4("x", "back", "10.0.0.5") is None
+    assert "already used by 'db'" in app.check_ipv4("x", "back", "10.0.0.9")
+    assert "taken by 'db'" in app.check_port("x", "5432:5432")
+
+
+def test_rollback_keeps_ports_when_old_address_is_invalid(make_app):
+    app = make_app({
+        "networks": {"back": {"subnet": "10.0.0.0/24"}},
+        "services": {"a": {"image": "x", "ports": ["8080:80"], "networks": {"back": "10.0.0.5"}}},
+    })
+    # the address no longer fits the network (an edit made outside update_network)
+    app.get_network("back").subnet = "10.9.0.0/24"
+    app._allocators.clear()
+    a = app.get_service("a")
+    before = _copy_details(a.service_details)
+    a.service_details["environment"]["MODE"] = "debug"
+    with pytest.raises(ValueError, match="outside subnet"):
+        app.update_service(a, before)
+    assert a.service_details == before
+    assert "taken by 'a'" in app.check_port("c", "8080:80")
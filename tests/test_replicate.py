@@ -0,0 +1,34 @@
+import pytest
+
+
+def test_replicate(make_app, spec):
+    app = make_app(spec)
+    created = app.replicate("web", 3, "web-{i}", env={"INDEX": "{i}"})
+    assert [svc.name for svc in created] == ["web-1", "web-2", "web-3"]
+    assert [svc.service_details["ports"][0] for svc in created] == ["8081:80", "8082:80", "8083:80"]
+    assert created[2].service_details["environment"]["INDEX"] == "3"
+
+
+def test_failed_replicate_releases_everything(make_app):
+    app = make_app({
+        "networks": {"big": {"subnet": "10.0.0.0/24"}, "tiny": {"subnet": "10.1.0.0/29"}},
+        "services": {"t": {"image": "x", "ports": ["8000:80"], "networks": {"big": "10.0.0.2", "tiny": "10.1.0.2"}}},
+    })
+    with pytest.raises(ValueError, match="no free address"):
+        app.replicate("t", 10, "t-{i}")  # tiny has 5 hosts: all or nothing
+    assert app.services.names() == ["t"]
+    assert list(app.allocator("big").owners.values()) == ["t"]
+    assert list(app.allocator("tiny").owners.values()) == ["t"]
+    assert app.check_port("x", "8001:80") is None
+
+
+def test_replicas_get_unique_container_names(make_app):
+    app = make_app({"services": {"web": {"image": "nginx", "container_name": "web-main"}}})
+    created = app.replicate("web", 3)  # default pattern {name}-{i}
+    assert [svc.service_details["container_name"] for svc in created] == ["web-main-1", "web-main-2", "web-main-3"]
+    created = app.replicate("web", 2, "edge{i}")
+    assert [svc.service_details["container_name"] for svc in created] == ["edge1", "edge2"]
+    yaml = pytest.importorskip("yaml")
+    app.export_compose()
+    names = [svc["container_name"] for svc in yaml.safe_load(app.file.read_text())["services"].values()]
+    assert len(set(names)) == len(names) == 6
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from magicompose import ProjectState, _copy_details, main
+
+
+def reopen(make_app):
+    app = make_app()
+    app.open_state()
+    return app
+
+
+def test_journal_replay(make_app, spec):
+    app = make_app()
+    app.open_state()
+    app.load_spec(spec)
+    web = app.get_service("web")
+    before = _copy_details(web.service_details)
+    web.service_details["environment"]["MODE"] = "debug"
+    app.update_service(web, before)
+    app.rename_service("worker", "jobs")
+    app.delete_service("jobs")
+    app.rename_network("front", "edge")
+    app.state.close()  # no compaction: everything comes from the journal
+
+    restored = reopen(make_app)
+    assert restored.state.pending == 9  # 2 networks, 3 services, edit, rename, delete, rename
+    assert restored.services.names() == ["db", "web"]
+    assert restored.networks.names() == ["back", "edge"]
+    assert restored.get_service("web").service_details == web.service_details
+    assert restored.get_service("web").render() == web.render()
+
+
+def test_compaction(make_app, spec):
+    app = make_app()
+    app.open_state()
+    app.load_spec(spec)
+    app.close_state()
+    state = ProjectState(app.file.parent / ".magicompose")
+    snapshot, entries = state.load()
+    assert entries == [] and len(snapshot["services"]) == 3
+
+    app = reopen(make_app)
+    app.delete_service("worker")
+    app.state.close()
+    restored = reopen(make_app)
+    assert restored.services.names() == ["db", "web"]
+
+
+def test_torn_journal_tail(tmp_path):
+    state = ProjectState(tmp_path)
+    state.append("op", n=1)
+    state.close()
+    with open(state.journal_path, "a") as f:
+        f.write('{"seq":2,"op":"op"')  # interrupted write
+    state = ProjectState(tmp_path)
+    assert [e["n"] for e in state.load()[1]] == [1]
+    state.append("op", n=2)
+    state.append("op", n=3)
+    state.close()
+    assert [e["n"] for e in ProjectState(tmp_path).load()[1]] == [1, 2, 3]
+
+
+def test_imported_services_survive_a_restart(make_app, spec):
+    make_app(spec).export_compose()
+    app = make_app()
+    app.open_state()
+    app.import_compose()
+    app.compact_state()
+    app.close_state()
+    restored = reopen(make_app)
+    assert restored.get_service("web").service_details == app.get_service("web").service_details
+
+
+@pytest.mark.parametrize("snapshot", ["{bad", json.dumps({"format": 99}), "[]"])
+def test_unreadable_snapshot(tmp_path, monkeypatch, capsys, snapshot):
+    (tmp_path / ".magicompose").mkdir()
+    (tmp_path / ".magicompose" / "snapshot.json").write_text(snapshot)
+    with pytest.raises(ValueError, match="snapshot.json"):
+        ProjectState(tmp_path / ".magicompose").load()
+    monkeypatch.chdir(tmp_path)
+    assert main(["--time-startup"]) == 1
+    assert "--no-state" in capsys.readouterr().out
+    assert main(["--time-startup", "--no-state"]) == 0
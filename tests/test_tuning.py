@@ -0,0 +1,28 @@
+import pytest
+
+
+def test_tuning_fields_export(make_app, spec, render):
+    yaml = pytest.importorskip("yaml")
+    doc = yaml.safe_load(render(make_app(spec)))
+    web = doc["services"]["web"]
+    assert web["depends_on"] == {"db": {"condition": "service_healthy"}}
+    assert web["deploy"]["resources"]["limits"] == {"cpus": "0.5", "memory": "512m"}
+    assert web["ulimits"]["nofile"] == {"soft": 1024, "hard": 2048}
+    assert doc["services"]["db"]["shm_size"] == "256m"
+
+
+def test_invalid_tuning_value(make_app):
+    with pytest.raises(ValueError, match="invalid memory"):
+        make_app({"services": {"x": {"resources": {"limits": {"memory": "lots"}}}}})
+
+
+def test_healthcheck_tests_round_trip(make_app):
+    tests = {"shell": "[ -f /tmp/ready ] || exit 1", "quoted": 'echo "ok" \\ done', "exec": ["CMD", "true"]}
+    app = make_app({"services": {name: {"image": "x", "healthcheck": {"test": test}} for name, test in tests.items()}})
+    app.export_compose()
+    yaml = pytest.importorskip("yaml")
+    doc = yaml.safe_load(app.file.read_text())
+    assert {name: svc["healthcheck"]["test"] for name, svc in doc["services"].items()} == tests
+    imported = make_app()
+    imported.import_compose()
+    assert {svc.name: svc.service_details["healthcheck"]["test"] for svc in imported.services} == tests